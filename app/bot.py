@@ -1,14 +1,23 @@
 """Telegram bot implementation for WB Ranker Bot."""
 
 import asyncio
+import html
 import logging
+import multiprocessing
 import os
-from typing import Dict, Any, Optional, List
+import re
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional, List, Set, Tuple, Union
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, Message
 from telegram.ext import (
-    Application, CommandHandler, MessageHandler, CallbackQueryHandler,
-    ContextTypes, filters
+    AIORateLimiter, Application, ApplicationHandlerStop, CommandHandler, MessageHandler,
+    CallbackQueryHandler, ContextTypes, TypeHandler, filters
 )
 
 from app.config import Settings
@@ -18,19 +27,174 @@ from app.wb_adapter import WBAPIAdapter
 from app.fileio import FileLoaderImpl
 from app.exporter import FileExporterImpl
 from app.utils import (
-    WBURLParser, format_price,
+    parse_wb_url, format_price,
     get_product_info, extract_keywords_from_product, 
-    filter_keywords_by_relevance, categorize_keywords
+    filter_keywords_by_relevance, categorize_keywords, setup_logging
 )
 
 
+# File hosting domains accepted as keyword file links
+_FILE_URL_RE = re.compile(
+    r'drive\.google\.com|docs\.google\.com|dropbox\.com|yandex\.ru/disk|cloud\.mail\.ru',
+    re.IGNORECASE
+)
+
+# Classifies text messages as file hosting URLs or other URLs in one match;
+# hosts are matched case-insensitively, the lowercase scheme is required
+_CLASSIFY = re.compile(
+    r'(?P<file>(?-i:https?://)\S*?(?:' + _FILE_URL_RE.pattern + r'))|(?P<url>(?-i:https?://))',
+    re.IGNORECASE
+)
+
+# Static bot replies are built once at import time
+_WELCOME_TEXT = """
+🤖 <b>WB Ranker Bot</b>
+
+Добро пожаловать! Этот бот поможет вам проанализировать позиции товаров на Wildberries.
+
+<b>Как использовать:</b>
+1. Отправьте ссылку на товар WB
+2. Загрузите файл с ключевыми словами (CSV/XLSX) или отправьте ссылку на файл
+3. Получите отчет с позициями товара
+
+<b>Команды:</b>
+/start - Начать работу
+/help - Помощь
+/status - Статус бота
+/cancel - Отменить текущую операцию
+
+<b>Поддерживаемые форматы файлов:</b>
+• CSV (.csv)
+• Excel (.xlsx, .xls)
+• Google Drive ссылки
+
+Начните с отправки ссылки на товар! 🚀
+"""
+
+_HELP_TEXT = """
+📖 <b>Справка по использованию WB Ranker Bot</b>
+
+<b>Пошаговая инструкция:</b>
+
+1️⃣ <b>Отправьте ссылку на товар</b>
+   Пример: https://wildberries.ru/catalog/12345/detail.aspx
+
+2️⃣ <b>Загрузите файл с ключевыми словами</b>
+   • CSV файл с ключевыми словами в первой колонке
+   • Excel файл (.xlsx, .xls)
+   • Или отправьте ссылку на файл (Google Drive, Dropbox, Яндекс.Диск)
+
+3️⃣ <b>Получите отчет</b>
+   • Позиции товара по каждому ключевому слову
+   • Статистика и анализ
+   • Экспорт в CSV/XLSX
+
+<b>Ограничения:</b>
+• Максимум 1000 ключевых слов за раз
+• Максимум 5 страниц поиска на ключевое слово
+• Время выполнения до 30 минут
+
+<b>Поддерживаемые форматы ссылок WB:</b>
+• https://wildberries.ru/catalog/ID/detail.aspx
+• https://www.wildberries.ru/catalog/ID/detail.aspx
+
+<b>Команды:</b>
+/start - Главное меню
+/help - Эта справка
+/status - Статус бота
+/cancel - Отменить операцию
+
+Нужна помощь? Отправьте /start для начала! 🚀
+"""
+
+_STATUS_TEMPLATE = """
+📊 <b>Статус WB Ranker Bot</b>
+
+🤖 <b>Бот:</b> Активен
+🌐 <b>WB API:</b> {api_status}
+📁 <b>Файловая система:</b> ✅ Доступна
+💾 <b>Экспорт:</b> ✅ Доступен
+
+<b>Настройки:</b>
+• Максимум страниц: {max_pages}
+• Лимит ключевых слов: {keywords_limit}
+• Таймаут запросов: {request_timeout}с
+• Директория вывода: {output_directory}
+
+<b>Активные сессии:</b> {active_sessions}
+"""
+
+_START_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📖 Помощь", callback_data="help")],
+    [InlineKeyboardButton("📊 Статус", callback_data="status")]
+])
+
+_INVALID_URL_TEMPLATE = (
+    "❌ <b>Неверная ссылка!</b>\n\n"
+    "🔗 <b>Вы отправили:</b> {url}...\n\n"
+    "📝 <b>Пожалуйста, отправьте ссылку на товар Wildberries:</b>\n"
+    "• https://www.wildberries.ru/catalog/123456/detail.aspx\n"
+    "• https://wildberries.ru/catalog/123456/detail.aspx\n\n"
+    "⚠️ <b>Не отправляйте:</b>\n"
+    "• Ссылки на Google Drive\n"
+    "• Ссылки на другие сайты\n"
+    "• Файлы с ключевыми словами (их нужно отправить после ссылки на товар)"
+)
+
+_PRODUCT_URL_REQUIRED_TEXT = "❌ Сначала отправьте ссылку на товар WB"
+
+_UNSUPPORTED_FORMAT_TEXT = (
+    "❌ Неподдерживаемый формат файла.\n"
+    "Поддерживаются: CSV, XLSX, XLS"
+)
+
+_FILE_TOO_LARGE_TEXT = (
+    "❌ Файл слишком большой.\n"
+    f"Максимальный размер: {FileLoaderImpl.MAX_FILE_SIZE // (1024 * 1024)} МБ"
+)
+
+_RANKING_BUSY_TEXT = (
+    "⏳ Анализ уже выполняется или ожидает в очереди.\n"
+    "Дождитесь результатов, прежде чем отправлять новый файл."
+)
+
+_UNKNOWN_COMMAND_TEXT = (
+    "❓ Не понимаю команду.\n\n"
+    "Отправьте:\n"
+    "• Ссылку на товар WB\n"
+    "• Файл с ключевыми словами\n"
+    "• Ссылку на файл (Google Drive)\n"
+    "• Команду /help для справки"
+)
+
+
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
+class UserSession:
+    """Per-user conversation state."""
+    
+    product_url: Optional[str] = None
+    product_id: Optional[int] = None
+    keywords_bytes: Optional[Tuple[str, Union[bytes, bytearray]]] = None
+    file_url: Optional[str] = None
+
+
 class TelegramProgressTracker(ProgressTracker):
     """Progress tracker implementation for Telegram bot."""
     
+    # Interval between timer-driven progress edits (seconds)
+    FLUSH_INTERVAL = 1.5
+    # Progress bar strings indexed by the number of filled cells
+    _BARS = tuple("█" * filled + "░" * (10 - filled) for filled in range(11))
+    
     def __init__(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         self.update = update
         self.context = context
+        self._bot = context.bot
+        self._chat_id = update.effective_chat.id
         self.last_message_id: Optional[int] = None
+        self._pending: Optional[tuple] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
     
     async def update_progress(
         self, 
@@ -40,174 +204,220 @@ class TelegramProgressTracker(ProgressTracker):
         eta: str = None
     ) -> None:
         """Update progress in Telegram."""
-        progress_text = f"🔄 Обработано: {current}/{total}"
+        self._pending = (current, total, message, eta)
+        
+        if self.last_message_id is None or current == total:
+            # First and final states are shown right away
+            self._cancel_flusher()
+            await self._flush()
+        elif self._flush_handle is None:
+            # Intermediate states are coalesced into one edit per interval
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.FLUSH_INTERVAL, self._start_flush, loop)
+    
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Timer callback publishing the latest pending progress."""
+        self._flush_handle = None
+        self._flush_task = loop.create_task(self._flush())
+    
+    def _cancel_flusher(self) -> None:
+        """Cancel the scheduled flush and any flush in flight."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+    
+    async def _flush(self) -> None:
+        """Send or edit the progress message with the latest pending state."""
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        
+        current, total, message, eta = pending
+        parts = [f"🔄 Обработано: {current}/{total}"]
         if message:
-            progress_text += f"\n📝 {message}"
+            parts.append(f"📝 {message}")
         if eta:
-            progress_text += f"\n⏱️ ETA: {eta}"
+            parts.append(f"⏱️ ETA: {eta}")
         
         # Create progress bar
-        progress_bar = self._create_progress_bar(current, total)
-        progress_text += f"\n{progress_bar}"
-        
+        parts.append(self._create_progress_bar(current, total))
+        await self._show("\n".join(parts))
+    
+    async def _send(self, text: str) -> Optional[Message]:
+        """Send a new message to the user's chat, logging failures."""
         try:
-            if self.last_message_id:
-                await self.context.bot.edit_message_text(
-                    chat_id=self.update.effective_chat.id,
-                    message_id=self.last_message_id,
-                    text=progress_text
-                )
-            else:
-                sent_message = await self.context.bot.send_message(
-                    chat_id=self.update.effective_chat.id,
-                    text=progress_text
-                )
-                self.last_message_id = sent_message.message_id
+            return await self._bot.send_message(
+                chat_id=self._chat_id,
+                text=text
+            )
         except Exception as e:
-            logging.warning(f"Failed to update progress: {e}")
+            logging.warning("Failed to send message: %s", e)
+            return None
     
-    async def send_message(self, message: str) -> None:
-        """Send a general message to the user."""
+    async def _show(self, text: str) -> None:
+        """Edit the progress message, or send it if none exists yet."""
+        if self.last_message_id is None:
+            sent_message = await self._send(text)
+            if sent_message is not None:
+                self.last_message_id = sent_message.message_id
+            return
+        
         try:
-            await self.context.bot.send_message(
-                chat_id=self.update.effective_chat.id,
-                text=message
+            await self._bot.edit_message_text(
+                chat_id=self._chat_id,
+                message_id=self.last_message_id,
+                text=text
             )
         except Exception as e:
-            logging.warning(f"Failed to send message: {e}")
+            logging.warning("Failed to update progress message: %s", e)
+    
+    async def send_message(self, message: str) -> None:
+        """Send a general message to the user."""
+        await self._send(message)
     
     async def send_error(self, error_message: str) -> None:
         """Send an error message to the user."""
-        try:
-            await self.context.bot.send_message(
-                chat_id=self.update.effective_chat.id,
-                text=f"❌ {error_message}",
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logging.warning(f"Failed to send error message: {e}")
+        await self._send(f"❌ {error_message}")
     
     async def send_success(self, success_message: str) -> None:
         """Send a success message to the user."""
-        try:
-            await self.context.bot.send_message(
-                chat_id=self.update.effective_chat.id,
-                text=f"✅ {success_message}",
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logging.warning(f"Failed to send success message: {e}")
+        await self._send(f"✅ {success_message}")
     
     def _create_progress_bar(self, current: int, total: int) -> str:
         """Create a visual progress bar."""
         if total == 0:
-            return "░░░░░░░░░░"
+            return self._BARS[0]
         
-        progress = current / total
-        filled = int(progress * 10)
-        empty = 10 - filled
+        filled = min(10, current * 10 // total)
         
-        return "█" * filled + "░" * empty + f" {progress:.1%}"
+        return f"{self._BARS[filled]} {current / total:.1%}"
     
     async def complete(self, message: str = "") -> None:
         """Mark progress as complete."""
-        try:
-            completion_text = f"✅ Завершено!"
-            if message:
-                completion_text += f"\n📝 {message}"
-            
-            if self.last_message_id:
-                await self.context.bot.edit_message_text(
-                    chat_id=self.update.effective_chat.id,
-                    message_id=self.last_message_id,
-                    text=completion_text
-                )
-            else:
-                await self.context.bot.send_message(
-                    chat_id=self.update.effective_chat.id,
-                    text=completion_text
-                )
-        except Exception as e:
-            logging.warning(f"Failed to send completion message: {e}")
+        self._cancel_flusher()
+        self._pending = None
+        
+        completion_text = "✅ Завершено!"
+        if message:
+            completion_text += f"\n📝 {message}"
+        await self._show(completion_text)
     
     async def error(self, message: str) -> None:
         """Mark progress as error."""
-        try:
-            error_text = f"❌ Ошибка: {message}"
-            
-            if self.last_message_id:
-                await self.context.bot.edit_message_text(
-                    chat_id=self.update.effective_chat.id,
-                    message_id=self.last_message_id,
-                    text=error_text
-                )
-            else:
-                await self.context.bot.send_message(
-                    chat_id=self.update.effective_chat.id,
-                    text=error_text
-                )
-        except Exception as e:
-            logging.warning(f"Failed to send error message: {e}")
+        self._cancel_flusher()
+        self._pending = None
+        await self._show(f"❌ Ошибка: {message}")
 
 
 class TelegramLogger(Logger):
-    """Logger implementation that also logs to Telegram."""
+    """Logger implementation that also mirrors messages to Telegram."""
+    
+    # Telegram message length limit for one mirrored batch
+    MIRROR_CHUNK_SIZE = 4000
+    # Delay before sending so that bursts of log lines go out as one message
+    MIRROR_DEBOUNCE = 0.5
+    # Maximum number of log lines joined into one message
+    MIRROR_BATCH_SIZE = 10
+    # Pending mirrored messages beyond this limit are dropped
+    MIRROR_QUEUE_SIZE = 1000
     
     def __init__(self, bot_context: Optional[ContextTypes.DEFAULT_TYPE] = None, 
-                 chat_id: Optional[int] = None):
+                 chat_id: Optional[int] = None, level: str = "ERROR"):
         self.bot_context = bot_context
         self.chat_id = chat_id
+        self.level = logging.getLevelName(level.upper())
         self.logger = logging.getLogger(__name__)
+        self._bot = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._mirror_queue: Optional[asyncio.Queue] = None
+        self._mirror_task: Optional[asyncio.Task] = None
     
-    def info(self, message: str, **kwargs) -> None:
+    def info(self, message: str, *args, **kwargs) -> None:
         """Log info message."""
-        self.logger.info(message)
-        if self.bot_context and self.chat_id:
-            try:
-                # Check if we're in an async context
-                loop = asyncio.get_running_loop()
-                if loop and not loop.is_closed():
-                    asyncio.create_task(self._send_to_telegram(f"ℹ️ {message}"))
-            except RuntimeError:
-                # No event loop running, skip Telegram logging
-                pass
-    
-    def warning(self, message: str, **kwargs) -> None:
+        self.logger.info(message, *args)
+        self._emit(logging.INFO, "ℹ️", message, args)
+    
+    def warning(self, message: str, *args, **kwargs) -> None:
         """Log warning message."""
-        self.logger.warning(message)
-        if self.bot_context and self.chat_id:
-            try:
-                # Check if we're in an async context
-                loop = asyncio.get_running_loop()
-                if loop and not loop.is_closed():
-                    asyncio.create_task(self._send_to_telegram(f"⚠️ {message}"))
-            except RuntimeError:
-                # No event loop running, skip Telegram logging
-                pass
-    
-    def error(self, message: str, **kwargs) -> None:
+        self.logger.warning(message, *args)
+        self._emit(logging.WARNING, "⚠️", message, args)
+    
+    def error(self, message: str, *args, **kwargs) -> None:
         """Log error message."""
-        self.logger.error(message)
-        if self.bot_context and self.chat_id:
-            try:
-                # Check if we're in an async context
-                loop = asyncio.get_running_loop()
-                if loop and not loop.is_closed():
-                    asyncio.create_task(self._send_to_telegram(f"❌ {message}"))
-            except RuntimeError:
-                # No event loop running, skip Telegram logging
-                pass
-    
-    def debug(self, message: str, **kwargs) -> None:
+        self.logger.error(message, *args)
+        self._emit(logging.ERROR, "❌", message, args)
+    
+    def debug(self, message: str, *args, **kwargs) -> None:
         """Log debug message."""
-        self.logger.debug(message)
+        self.logger.debug(message, *args)
+    
+    def attach_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Bind to the bot event loop and start sending mirrored messages."""
+        if self._mirror_task is not None:
+            return
+        
+        self._bot = self.bot_context.bot if self.bot_context else None
+        self._loop = loop
+        self._mirror_queue = asyncio.Queue(maxsize=self.MIRROR_QUEUE_SIZE)
+        self._mirror_task = loop.create_task(self._consume_mirror_queue())
+    
+    async def stop(self) -> None:
+        """Stop the background mirroring task."""
+        if self._mirror_task is None:
+            return
+        
+        self._mirror_task.cancel()
+        try:
+            await self._mirror_task
+        except asyncio.CancelledError:
+            pass
+        self._mirror_task = None
+        self._mirror_queue = None
+        self._loop = None
+        self._bot = None
+    
+    def _emit(self, level: int, prefix: str, message: str, args: tuple = ()) -> None:
+        """Queue message for Telegram if it passes the level filter."""
+        if level < self.level or self._bot is None or not self.chat_id:
+            return
+        
+        # Skip Telegram logging once the attached event loop is gone
+        if self._loop.is_closed():
+            return
+        
+        try:
+            self._mirror_queue.put_nowait(f"{prefix} {message % args if args else message}")
+        except asyncio.QueueFull:
+            # Telegram is falling behind, keep only the local log record
+            pass
+    
+    async def _consume_mirror_queue(self) -> None:
+        """Send queued messages in batches limited by Telegram message size."""
+        queue = self._mirror_queue
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0])
+            await asyncio.sleep(self.MIRROR_DEBOUNCE)
+            
+            while not queue.empty() and len(batch) < self.MIRROR_BATCH_SIZE:
+                message = queue.get_nowait()
+                if size + len(message) + 1 > self.MIRROR_CHUNK_SIZE:
+                    await self._send_to_telegram("\n".join(batch))
+                    batch, size = [], -1
+                batch.append(message)
+                size += len(message) + 1
+            
+            await self._send_to_telegram("\n".join(batch))
     
     async def _send_to_telegram(self, message: str) -> None:
         """Send message to Telegram."""
         try:
-            await self.bot_context.bot.send_message(
+            await self._bot.send_message(
                 chat_id=self.chat_id,
-                text=message[:4000]  # Telegram message limit
+                text=message[:self.MIRROR_CHUNK_SIZE]  # Telegram message limit
             )
         except Exception as e:
             self.logger.warning(f"Failed to send log to Telegram: {e}")
@@ -216,28 +426,58 @@ class TelegramLogger(Logger):
 class WBRankerBot:
     """Main Telegram bot class."""
     
+    # Maximum number of recently seen update IDs kept for deduplication
+    SEEN_UPDATES_MAX = 1000
+    # How long a WB API health check result is reused (seconds)
+    HEALTH_CHECK_TTL = 30.0
+    # Telegram limit for document captions (characters)
+    CAPTION_MAX_LENGTH = 1024
+    # Interval between background cleanups of old export files (seconds)
+    CLEANUP_INTERVAL = 3600.0
+    # Export files older than this are removed by the cleanup (days)
+    EXPORT_MAX_AGE_DAYS = 7
+    
     def __init__(self, settings: Settings):
         self.settings = settings
-        self.logger = TelegramLogger()
+        self.logger = TelegramLogger(level=settings.tg_log_level)
         self.application = None
-        self.ranking_service = None
-        self.active_sessions: Dict[int, Dict[str, Any]] = {}
+        self.wb_adapter: Optional[WBAPIAdapter] = None
+        self.file_loader: Optional[FileLoaderImpl] = None
+        self.active_sessions: Dict[int, UserSession] = {}
+        self._seen_updates: "OrderedDict[int, float]" = OrderedDict()
+        self._health_cache: Optional[Tuple[float, bool]] = None
+        self._ranking_sem = asyncio.Semaphore(settings.max_concurrent_rankings)
+        self._ranking_waiters = 0
+        # Users with a ranking running or queued; one ranking per user at a time
+        self._ranking_users: Set[int] = set()
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._export_pool: Optional[ProcessPoolExecutor] = None
     
     async def initialize(self) -> None:
         """Initialize bot components."""
         try:
+            if sys.version_info >= (3, 12):
+                # Run short-lived handler coroutines eagerly without scheduling a Task
+                asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+            
+            self.logger.attach_loop(asyncio.get_running_loop())
+            
             # Initialize components
             self.file_loader = FileLoaderImpl(self.settings, self.logger)
-            self.file_exporter = FileExporterImpl(self.settings, self.logger)
-            
-            # Initialize ranking service
-            self.ranking_service = RankingServiceImpl(
-                settings=self.settings,
-                search_client=None,  # Will be set per request
-                file_loader=self.file_loader,
-                file_exporter=self.file_exporter,
-                logger=self.logger
-            )
+            if self.settings.export_process_workers > 0:
+                # Spawned workers do not inherit the event loop and its threads
+                self._export_pool = ProcessPoolExecutor(
+                    max_workers=self.settings.export_process_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            self.file_exporter = FileExporterImpl(self.settings, self.logger, self._export_pool)
+            
+            # Shared WB API adapter keeps one connection pool for the bot lifetime
+            self.wb_adapter = WBAPIAdapter(self.settings, self.logger)
+            await self.wb_adapter.__aenter__()
+            
+            # Old exports are removed in the background, off the request path
+            self._cleanup_task = asyncio.create_task(self._cleanup_exports_periodically())
             
             self.logger.info("Bot components initialized successfully")
             
@@ -245,130 +485,109 @@ class WBRankerBot:
             self.logger.error(f"Failed to initialize bot: {e}")
             raise
     
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle /start command."""
-        welcome_text = """
-🤖 <b>WB Ranker Bot</b>
-
-Добро пожаловать! Этот бот поможет вам проанализировать позиции товаров на Wildberries.
-
-<b>Как использовать:</b>
-1. Отправьте ссылку на товар WB
-2. Загрузите файл с ключевыми словами (CSV/XLSX) или отправьте ссылку на файл
-3. Получите отчет с позициями товара
-
-<b>Команды:</b>
-/start - Начать работу
-/help - Помощь
-/status - Статус бота
-/cancel - Отменить текущую операцию
-
-<b>Поддерживаемые форматы файлов:</b>
-• CSV (.csv)
-• Excel (.xlsx, .xls)
-• Google Drive ссылки
-
-Начните с отправки ссылки на товар! 🚀
-        """
+    def _is_duplicate(self, update: Update) -> bool:
+        """Check if update was already seen and remember it otherwise."""
+        update_id = update.update_id
+        if update_id in self._seen_updates:
+            return True
+        
+        self._seen_updates[update_id] = time.monotonic()
+        self._seen_updates.move_to_end(update_id)
+        while len(self._seen_updates) > self.SEEN_UPDATES_MAX:
+            self._seen_updates.popitem(last=False)
+        
+        return False
+    
+    async def drop_duplicate_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Stop processing of updates redelivered by Telegram."""
+        if self._is_duplicate(update):
+            self.logger.debug("Skipping duplicate update: %s", update.update_id)
+            raise ApplicationHandlerStop
+    
+    async def _cleanup_exports_periodically(self) -> None:
+        """Remove old export files once per cleanup interval."""
+        while True:
+            await asyncio.sleep(self.CLEANUP_INTERVAL)
+            await asyncio.to_thread(
+                self.file_exporter.cleanup_old_files,
+                self.settings.output_directory,
+                self.EXPORT_MAX_AGE_DAYS
+            )
+    
+    async def shutdown(self) -> None:
+        """Release bot components."""
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
         
-        keyboard = [
-            [InlineKeyboardButton("📖 Помощь", callback_data="help")],
-            [InlineKeyboardButton("📊 Статус", callback_data="status")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        if self.wb_adapter is not None:
+            await self.wb_adapter.__aexit__(None, None, None)
+            self.wb_adapter = None
         
+        if self.file_loader is not None:
+            await self.file_loader.close()
+        
+        if self._export_pool is not None:
+            self._export_pool.shutdown(wait=False, cancel_futures=True)
+            self._export_pool = None
+        
+        await self.logger.stop()
+    
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /start command."""
         await update.message.reply_text(
-            welcome_text,
+            _WELCOME_TEXT,
             parse_mode='HTML',
-            reply_markup=reply_markup
+            reply_markup=_START_KEYBOARD
         )
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /help command."""
-        help_text = """
-📖 <b>Справка по использованию WB Ranker Bot</b>
-
-<b>Пошаговая инструкция:</b>
-
-1️⃣ <b>Отправьте ссылку на товар</b>
-   Пример: https://wildberries.ru/catalog/12345/detail.aspx
-
-2️⃣ <b>Загрузите файл с ключевыми словами</b>
-   • CSV файл с ключевыми словами в первой колонке
-   • Excel файл (.xlsx, .xls)
-   • Или отправьте ссылку на файл (Google Drive, Dropbox, Яндекс.Диск)
-
-3️⃣ <b>Получите отчет</b>
-   • Позиции товара по каждому ключевому слову
-   • Статистика и анализ
-   • Экспорт в CSV/XLSX
-
-<b>Ограничения:</b>
-• Максимум 1000 ключевых слов за раз
-• Максимум 5 страниц поиска на ключевое слово
-• Время выполнения до 30 минут
-
-<b>Поддерживаемые форматы ссылок WB:</b>
-• https://wildberries.ru/catalog/ID/detail.aspx
-• https://www.wildberries.ru/catalog/ID/detail.aspx
-
-<b>Команды:</b>
-/start - Главное меню
-/help - Эта справка
-/status - Статус бота
-/cancel - Отменить операцию
-
-Нужна помощь? Отправьте /start для начала! 🚀
-        """
-        
-        await update.message.reply_text(help_text, parse_mode='HTML')
+        await update.message.reply_text(_HELP_TEXT, parse_mode='HTML')
     
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /status command."""
         try:
             # Check WB API health
-            async with WBAPIAdapter(self.settings, self.logger) as wb_adapter:
-                api_healthy = await wb_adapter.health_check()
+            api_healthy = await self._check_api_health()
             
-            status_text = f"""
-📊 <b>Статус WB Ranker Bot</b>
-
-🤖 <b>Бот:</b> Активен
-🌐 <b>WB API:</b> {'✅ Доступен' if api_healthy else '❌ Недоступен'}
-📁 <b>Файловая система:</b> ✅ Доступна
-💾 <b>Экспорт:</b> ✅ Доступен
-
-<b>Настройки:</b>
-• Максимум страниц: {self.settings.wb_max_pages}
-• Лимит ключевых слов: {self.settings.max_keywords_limit}
-• Таймаут запросов: {self.settings.wb_request_timeout}с
-• Директория вывода: {self.settings.output_directory}
-
-<b>Активные сессии:</b> {len(self.active_sessions)}
-            """
+            status_text = _STATUS_TEMPLATE.format(
+                api_status='✅ Доступен' if api_healthy else '❌ Недоступен',
+                max_pages=self.settings.wb_max_pages,
+                keywords_limit=self.settings.max_keywords_limit,
+                request_timeout=self.settings.wb_request_timeout,
+                output_directory=self.settings.output_directory,
+                active_sessions=len(self.active_sessions),
+            )
             
             await update.message.reply_text(status_text, parse_mode='HTML')
             
         except Exception as e:
             await update.message.reply_text(
-                f"❌ Ошибка при проверке статуса: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при проверке статуса: {e}"
             )
     
+    async def _check_api_health(self) -> bool:
+        """Check WB API health through the shared adapter, reusing recent results."""
+        now = time.monotonic()
+        if self._health_cache is not None and now - self._health_cache[0] < self.HEALTH_CHECK_TTL:
+            return self._health_cache[1]
+        
+        api_healthy = self.wb_adapter is not None and await self.wb_adapter.health_check()
+        self._health_cache = (now, api_healthy)
+        return api_healthy
+    
     async def cancel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /cancel command."""
         user_id = update.effective_user.id
         
-        if user_id in self.active_sessions:
-            del self.active_sessions[user_id]
+        if self.active_sessions.pop(user_id, None) is not None:
             await update.message.reply_text(
-                "✅ Операция отменена",
-                parse_mode='HTML'
+                "✅ Операция отменена"
             )
         else:
             await update.message.reply_text(
-                "ℹ️ Нет активных операций для отмены",
-                parse_mode='HTML'
+                "ℹ️ Нет активных операций для отмены"
             )
     
     async def handle_url_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -376,70 +595,50 @@ class WBRankerBot:
         user_id = update.effective_user.id
         url = update.message.text.strip()
         
-        self.logger.info(f"URL handler - User ID: {user_id}, URL: {url[:50]}...")
+        self.logger.info("URL handler - User ID: %s, URL: %.50s...", user_id, url)
         
         try:
-            # Validate URL
-            parser = WBURLParser()
-            if not parser.validate_wb_url(url):
-                await update.message.reply_text(
-                    f"❌ <b>Неверная ссылка!</b>\n\n"
-                    f"🔗 <b>Вы отправили:</b> {url[:50]}...\n\n"
-                    f"📝 <b>Пожалуйста, отправьте ссылку на товар Wildberries:</b>\n"
-                    f"• https://www.wildberries.ru/catalog/123456/detail.aspx\n"
-                    f"• https://wildberries.ru/catalog/123456/detail.aspx\n\n"
-                    f"⚠️ <b>Не отправляйте:</b>\n"
-                    f"• Ссылки на Google Drive\n"
-                    f"• Ссылки на другие сайты\n"
-                    f"• Файлы с ключевыми словами (их нужно отправить после ссылки на товар)",
-                    parse_mode='HTML'
-                )
-                return
-            
-            # Extract product ID
-            try:
-                product_id = parser.extract_product_id(url)
-            except ValueError as e:
+            # Validate URL and extract product ID, rejecting obvious non-WB links cheaply
+            product_id = None
+            if 'wildberries.' in url and '/catalog/' in url:
+                product_id = parse_wb_url(url)
+            if product_id is None:
                 await update.message.reply_text(
-                    f"❌ <b>Ошибка извлечения ID товара!</b>\n\n"
-                    f"📝 <b>Ошибка:</b> {str(e)}\n\n"
-                    f"🔗 <b>Проверьте правильность ссылки на товар Wildberries</b>",
+                    _INVALID_URL_TEMPLATE.format(url=html.escape(url[:50])),
                     parse_mode='HTML'
                 )
                 return
             
             # Store URL in user session
-            if user_id not in self.active_sessions:
-                self.active_sessions[user_id] = {}
-            
-            self.active_sessions[user_id]['product_url'] = url
-            self.active_sessions[user_id]['product_id'] = product_id
+            session = self.active_sessions.setdefault(user_id, UserSession())
+            session.product_url = url
+            session.product_id = product_id
             
-            self.logger.info(f"Session created/updated for user {user_id}: {list(self.active_sessions[user_id].keys())}")
+            self.logger.info("Session created/updated for user %s: product %s", user_id, product_id)
             
             await update.message.reply_text(
                 f"✅ Ссылка на товар принята!\n"
                 f"🆔 ID товара: {product_id}\n\n"
-                f"Теперь отправьте файл с ключевыми словами или ссылку на файл.",
-                parse_mode='HTML'
+                f"Теперь отправьте файл с ключевыми словами или ссылку на файл."
             )
             
         except Exception as e:
             self.logger.error(f"Error handling URL: {e}")
             await update.message.reply_text(
-                f"❌ Ошибка при обработке ссылки: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при обработке ссылки: {e}"
             )
     
     async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle document uploads."""
         user_id = update.effective_user.id
+        session = self.active_sessions.get(user_id)
         
-        if user_id not in self.active_sessions:
-            await update.message.reply_text(
-                "❌ Сначала отправьте ссылку на товар WB",
-                parse_mode='HTML'
-            )
+        if session is None:
+            await update.message.reply_text(_PRODUCT_URL_REQUIRED_TEXT)
+            return
+        
+        if user_id in self._ranking_users:
+            await update.message.reply_text(_RANKING_BUSY_TEXT)
             return
         
         try:
@@ -448,36 +647,39 @@ class WBRankerBot:
             
             # Check file extension
             if not file_name.lower().endswith(('.csv', '.xlsx', '.xls')):
-                await update.message.reply_text(
-                    "❌ Неподдерживаемый формат файла.\n"
-                    "Поддерживаются: CSV, XLSX, XLS",
-                    parse_mode='HTML'
-                )
+                await update.message.reply_text(_UNSUPPORTED_FORMAT_TEXT)
                 return
             
-            # Download file
-            file = await context.bot.get_file(document.file_id)
-            file_path = f"temp_{user_id}_{file_name}"
-            
-            await file.download_to_drive(file_path)
-            
-            # Store file path in session
-            self.active_sessions[user_id]['keywords_file'] = file_path
-            
-            await update.message.reply_text(
-                f"✅ Файл загружен: {file_name}\n\n"
-                f"Начинаем анализ...",
-                parse_mode='HTML'
-            )
+            # Reject oversized files before downloading them
+            if document.file_size and document.file_size > FileLoaderImpl.MAX_FILE_SIZE:
+                await update.message.reply_text(_FILE_TOO_LARGE_TEXT)
+                return
             
-            # Start ranking process with filtering
-            await self._start_ranking_process_with_file(update, context, user_id)
+            # No await since the busy check above, so no other upload got in between
+            self._ranking_users.add(user_id)
+            try:
+                # Download file into memory through the bot's request settings,
+                # keeping the downloaded buffer instead of copying it into bytes
+                file = await context.bot.get_file(document.file_id)
+                content = await file.download_as_bytearray()
+                
+                # Store file content in session
+                session.keywords_bytes = (file_name, content)
+                
+                await update.message.reply_text(
+                    f"✅ Файл загружен: {file_name}\n\n"
+                    f"Начинаем анализ..."
+                )
+                
+                # Start ranking process with filtering
+                await self._start_ranking_process(update, context, user_id)
+            finally:
+                self._ranking_users.discard(user_id)
             
         except Exception as e:
             self.logger.error(f"Error handling document: {e}")
             await update.message.reply_text(
-                f"❌ Ошибка при обработке файла: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при обработке файла: {e}"
             )
     
     async def handle_text_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -485,41 +687,20 @@ class WBRankerBot:
         text = update.message.text.strip()
         
         # Debug: log message processing
-        self.logger.info(f"Text message handler - Text: {text[:50]}...")
+        self.logger.info("Text message handler - Text: %.50s...", text)
         
-        # Check if it's a URL
-        if text.startswith(('http://', 'https://')):
-            # Check if it's a Google Drive or other file URL
-            is_file_url = self._is_file_url(text)
-            self.logger.info(f"URL detected - Is file URL: {is_file_url}")
+        # Check if it's a file URL (Google Drive, etc.) or another URL
+        match = _CLASSIFY.match(text)
+        if match is not None:
+            is_file_url = match.group('file') is not None
+            self.logger.info("URL detected - Is file URL: %s", is_file_url)
             
             if is_file_url:
                 await self.handle_file_url_message(update, context)
             else:
                 await self.handle_url_message(update, context)
         else:
-            await update.message.reply_text(
-                "❓ Не понимаю команду.\n\n"
-                "Отправьте:\n"
-                "• Ссылку на товар WB\n"
-                "• Файл с ключевыми словами\n"
-                "• Ссылку на файл (Google Drive)\n"
-                "• Команду /help для справки",
-                parse_mode='HTML'
-            )
-    
-    def _is_file_url(self, url: str) -> bool:
-        """Check if URL is a file URL (Google Drive, etc.)."""
-        file_domains = [
-            'drive.google.com',
-            'docs.google.com',
-            'dropbox.com',
-            'yandex.ru/disk',
-            'cloud.mail.ru'
-        ]
-        is_file = any(domain in url.lower() for domain in file_domains)
-        self.logger.info(f"URL check: {url[:50]}... -> is_file: {is_file}")
-        return is_file
+            await update.message.reply_text(_UNKNOWN_COMMAND_TEXT)
     
     async def handle_file_url_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle file URL messages (Google Drive, etc.)."""
@@ -528,36 +709,40 @@ class WBRankerBot:
         
         try:
             # Debug: log session state
-            self.logger.info(f"File URL handler - User ID: {user_id}, Active sessions: {list(self.active_sessions.keys())}")
-            if user_id in self.active_sessions:
-                self.logger.info(f"User session keys: {list(self.active_sessions[user_id].keys())}")
+            session = self.active_sessions.get(user_id)
+            self.logger.info("File URL handler - User ID: %s, Active sessions: %d", user_id, len(self.active_sessions))
+            if session is not None:
+                self.logger.info("User session product: %s", session.product_id)
             
             # Check if user has a product URL in session
-            if user_id not in self.active_sessions or 'product_url' not in self.active_sessions[user_id]:
-                await update.message.reply_text(
-                    "❌ Сначала отправьте ссылку на товар WB",
-                    parse_mode='HTML'
-                )
+            if session is None or session.product_url is None:
+                await update.message.reply_text(_PRODUCT_URL_REQUIRED_TEXT)
                 return
             
-            # Store file URL in session
-            self.active_sessions[user_id]['file_url'] = url
-            
-            await update.message.reply_text(
-                f"✅ Ссылка на файл принята!\n"
-                f"🔗 URL: {url}\n\n"
-                f"Начинаем загрузку и анализ...",
-                parse_mode='HTML'
-            )
+            if user_id in self._ranking_users:
+                await update.message.reply_text(_RANKING_BUSY_TEXT)
+                return
             
-            # Start ranking process with file URL
-            await self._start_ranking_process_with_url(update, context, user_id)
+            self._ranking_users.add(user_id)
+            try:
+                # Store file URL in session
+                session.file_url = url
+                
+                await update.message.reply_text(
+                    f"✅ Ссылка на файл принята!\n"
+                    f"🔗 URL: {url}\n\n"
+                    f"Начинаем загрузку и анализ..."
+                )
+                
+                # Start ranking process with file URL
+                await self._start_ranking_process(update, context, user_id)
+            finally:
+                self._ranking_users.discard(user_id)
             
         except Exception as e:
             self.logger.error(f"Error handling file URL: {e}")
             await update.message.reply_text(
-                f"❌ Ошибка при обработке ссылки на файл: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при обработке ссылки на файл: {e}"
             )
     
     async def callback_query_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -570,61 +755,37 @@ class WBRankerBot:
         elif query.data == "status":
             await self.status_command(update, context)
     
-    async def _start_ranking_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
-        """Start the ranking process."""
-        try:
-            session = self.active_sessions[user_id]
-            product_url = session['product_url']
-            keywords_file = session['keywords_file']
-            
-            # Create progress tracker
-            progress_tracker = TelegramProgressTracker(update, context)
-            
-            # Initialize search client
-            async with WBAPIAdapter(self.settings, self.logger) as search_client:
-                # Update ranking service with search client
-                self.ranking_service.search_client = search_client
-                self.ranking_service.progress_tracker = progress_tracker
-                
-                # Start ranking
-                result = await self.ranking_service.rank_product_by_keywords(
-                    product_url=product_url,
-                    keywords_source=keywords_file,
-                    output_format="xlsx"
-                )
-                
-                # Send results
-                await self._send_ranking_results(update, context, result)
-                
-        except Exception as e:
-            self.logger.error(f"Error in ranking process: {e}")
+    @asynccontextmanager
+    async def _ranking_slot(self, update: Update):
+        """Wait for a free ranking slot, telling the user about the queue."""
+        if self._ranking_sem.locked():
             await update.message.reply_text(
-                f"❌ Ошибка при анализе: {e}",
-                parse_mode='HTML'
+                f"⏳ Анализ в очереди, позиция {self._ranking_waiters + 1}. "
+                f"Он начнется автоматически."
             )
+        
+        self._ranking_waiters += 1
+        try:
+            await self._ranking_sem.acquire()
         finally:
-            # Cleanup
-            if user_id in self.active_sessions:
-                session = self.active_sessions[user_id]
-                if 'keywords_file' in session:
-                    try:
-                        os.remove(session['keywords_file'])
-                    except OSError:
-                        pass
-                del self.active_sessions[user_id]
+            self._ranking_waiters -= 1
+        
+        try:
+            yield
+        finally:
+            self._ranking_sem.release()
     
     async def _analyze_and_filter_keywords(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                                         product_url: str, file_source: str) -> List[str]:
+                                         product_url: str,
+                                         file_source: Union[str, Tuple[str, Union[bytes, bytearray]]]) -> List[str]:
         """Analyze product and filter keywords from file."""
         try:
             # Extract product ID from URL
-            parser = WBURLParser()
-            try:
-                product_id = parser.extract_product_id(product_url)
-            except ValueError as e:
+            product_id = parse_wb_url(product_url)
+            if product_id is None:
                 await update.message.reply_text(
                     f"❌ <b>Неверная ссылка!</b>\n\n"
-                    f"📝 <b>Ошибка:</b> {str(e)}\n\n"
+                    f"📝 <b>Ошибка:</b> Invalid Wildberries URL: {product_url}\n\n"
                     f"🔗 <b>Пожалуйста, отправьте ссылку на товар Wildberries:</b>\n"
                     f"• https://www.wildberries.ru/catalog/123456/detail.aspx\n"
                     f"• https://wildberries.ru/catalog/123456/detail.aspx\n\n"
@@ -641,47 +802,56 @@ class WBRankerBot:
                 parse_mode='HTML'
             )
             
-            # Get product information
-            self.logger.info(f"Getting product info for ID: {product_id}")
-            product_info = await get_product_info(product_id)
-            
-            # Check if we got real product info or fallback
-            is_fallback = product_info.get('is_fallback', False) or (
-                product_info.get('name', '').startswith('Товар ') and 
-                product_info.get('brand') == 'Неизвестно'
-            )
-            
-            if is_fallback:
-                self.logger.warning(f"Using fallback product info for ID: {product_id}")
-                await analysis_msg.edit_text(
-                    f"⚠️ <b>Товар не найден в популярных категориях</b>\n\n"
-                    f"📦 ID товара: {product_id}\n"
-                    f"🔄 <b>Используем все ключевые слова без фильтрации</b>\n\n"
-                    f"⏳ Загружаем файл с ключевыми словами...",
-                    parse_mode='HTML'
+            # Load keywords in the background while product info is fetched
+            keywords_task = asyncio.create_task(self._load_keywords(file_source))
+            try:
+                # Get product information
+                self.logger.info(f"Getting product info for ID: {product_id}")
+                product_info = await get_product_info(product_id)
+                
+                # Check if we got real product info or fallback
+                is_fallback = product_info.get('is_fallback', False) or (
+                    product_info.get('name', '').startswith('Товар ') and 
+                    product_info.get('brand') == 'Неизвестно'
                 )
-            else:
-                self.logger.info(f"Product info retrieved: {product_info.get('name', 'N/A')}")
                 
+                if is_fallback:
+                    self.logger.warning(f"Using fallback product info for ID: {product_id}")
+                    await analysis_msg.edit_text(
+                        f"⚠️ <b>Товар не найден в популярных категориях</b>\n\n"
+                        f"📦 ID товара: {product_id}\n"
+                        f"🔄 <b>Используем все ключевые слова без фильтрации</b>\n\n"
+                        f"⏳ Загружаем файл с ключевыми словами...",
+                        parse_mode='HTML'
+                    )
+                else:
+                    self.logger.info(f"Product info retrieved: {product_info.get('name', 'N/A')}")
+                
+                    await analysis_msg.edit_text(
+                        f"✅ <b>Товар найден!</b>\n\n"
+                        f"📦 <b>Название:</b> {product_info.get('name', 'N/A')}\n"
+                        f"🏷️ <b>Бренд:</b> {product_info.get('brand', 'N/A')}\n"
+                        f"📂 <b>Категория:</b> {product_info.get('subject', 'N/A')}\n\n"
+                        f"⏳ Загружаем файл с ключевыми словами...",
+                        parse_mode='HTML'
+                    )
+                
+                keywords = await keywords_task
+            finally:
+                # No-op once loaded; stops the download if product lookup failed
+                keywords_task.cancel()
+            
+            if not keywords:
                 await analysis_msg.edit_text(
-                    f"✅ <b>Товар найден!</b>\n\n"
-                    f"📦 <b>Название:</b> {product_info.get('name', 'N/A')}\n"
-                    f"🏷️ <b>Бренд:</b> {product_info.get('brand', 'N/A')}\n"
-                    f"📂 <b>Категория:</b> {product_info.get('subject', 'N/A')}\n\n"
-                    f"⏳ Загружаем файл с ключевыми словами...",
-                    parse_mode='HTML'
+                    "❌ Не удалось загрузить ключевые слова из файла"
                 )
+                return []
             
-            # Load keywords from file or URL
-            if file_source.startswith(('http://', 'https://')):
-                keywords = await self.file_loader.load_keywords_from_url(file_source)
-            else:
-                keywords = await self.file_loader.load_keywords_from_file(file_source)
-            
-            if not keywords:
+            # The loader stops reading one keyword past the limit, so an oversized
+            # file is rejected here rather than filtered and ranked on a prefix
+            if not self.file_loader.validate_keywords_count(keywords):
                 await analysis_msg.edit_text(
-                    "❌ Не удалось загрузить ключевые слова из файла",
-                    parse_mode='HTML'
+                    f"❌ Слишком много ключевых слов в файле: больше {self.settings.max_keywords_limit}"
                 )
                 return []
             
@@ -714,7 +884,9 @@ class WBRankerBot:
                 
                 # Filter keywords by relevance
                 self.logger.info(f"Filtering {len(keywords)} keywords against product keywords: {product_keywords}")
-                relevant_keywords = filter_keywords_by_relevance(keywords, product_keywords)
+                relevant_keywords = await asyncio.to_thread(
+                    filter_keywords_by_relevance, keywords, product_keywords
+                )
                 self.logger.info(f"After filtering: {len(relevant_keywords)} relevant keywords")
                 
                 # Calculate efficiency
@@ -735,88 +907,52 @@ class WBRankerBot:
         except Exception as e:
             self.logger.error(f"Error in keyword analysis and filtering: {e}")
             await update.message.reply_text(
-                f"❌ Ошибка при анализе и фильтрации: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при анализе и фильтрации: {e}"
             )
             return []
     
-    async def _start_ranking_process_with_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
-        """Start the ranking process with file filtering."""
+    async def _load_keywords(self, file_source: Union[str, Tuple[str, Union[bytes, bytearray]]]) -> List[str]:
+        """Load keywords from uploaded content, URL or file."""
+        if isinstance(file_source, tuple):
+            return await self.file_loader.load_keywords_from_bytes(*file_source)
+        if file_source.startswith(('http://', 'https://')):
+            return await self.file_loader.load_keywords_from_url(file_source)
+        return await self.file_loader.load_keywords_from_file(file_source)
+    
+    async def _start_ranking_process(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+        """Start the ranking process for uploaded file or file URL."""
+        session = self.active_sessions.get(user_id)
+        if session is None:
+            return
+        
         try:
-            session = self.active_sessions[user_id]
-            product_url = session['product_url']
-            keywords_file = session['keywords_file']
-            
-            # Analyze product and filter keywords
-            relevant_keywords = await self._analyze_and_filter_keywords(update, context, product_url, keywords_file)
-            
-            if not relevant_keywords:
-                await update.message.reply_text(
-                    "❌ Не удалось получить релевантные ключевые слова",
-                    parse_mode='HTML'
-                )
-                return
-            
-            # Create progress tracker
-            progress_tracker = TelegramProgressTracker(update, context)
-            
-            # Initialize search client
-            async with WBAPIAdapter(self.settings, self.logger) as search_client:
-                # Update ranking service with search client
-                self.ranking_service.search_client = search_client
-                self.ranking_service.progress_tracker = progress_tracker
+            async with self._ranking_slot(update):
+                # /cancel while queued drops (or replaces) the session
+                if self.active_sessions.get(user_id) is not session:
+                    self.logger.info("Ranking for user %s cancelled while queued", user_id)
+                    return
                 
-                # Start ranking with filtered keywords
-                result = await self.ranking_service.rank_product_by_keywords(
-                    product_url=product_url,
-                    keywords_source=relevant_keywords,  # Use filtered keywords instead of file path
-                    output_format="xlsx"
-                )
+                product_url = session.product_url
+                keywords_source = session.keywords_bytes or session.file_url
                 
-                # Send results
-                await self._send_ranking_results(update, context, result)
+                # Analyze product and filter keywords
+                relevant_keywords = await self._analyze_and_filter_keywords(update, context, product_url, keywords_source)
                 
-        except Exception as e:
-            self.logger.error(f"Error in ranking process with file: {e}")
-            await update.message.reply_text(
-                f"❌ Ошибка при анализе: {e}",
-                parse_mode='HTML'
-            )
-        finally:
-            # Cleanup
-            if user_id in self.active_sessions:
-                del self.active_sessions[user_id]
-
-    async def _start_ranking_process_with_url(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
-        """Start the ranking process with file URL."""
-        try:
-            session = self.active_sessions[user_id]
-            product_url = session['product_url']
-            file_url = session['file_url']
-            
-            # Analyze product and filter keywords
-            relevant_keywords = await self._analyze_and_filter_keywords(update, context, product_url, file_url)
-            
-            if not relevant_keywords:
-                await update.message.reply_text(
-                    "❌ Не удалось получить релевантные ключевые слова",
-                    parse_mode='HTML'
-                )
-                return
-            
-            # Create progress tracker
-            progress_tracker = TelegramProgressTracker(update, context)
-            
-            # Initialize search client
-            async with WBAPIAdapter(self.settings, self.logger) as search_client:
-                # Update ranking service with search client
-                self.ranking_service.search_client = search_client
-                self.ranking_service.progress_tracker = progress_tracker
+                if not relevant_keywords:
+                    await update.message.reply_text(
+                        "❌ Не удалось получить релевантные ключевые слова"
+                    )
+                    return
+                
+                # Each run gets its own service so concurrent rankings
+                # do not share a progress tracker or statistics
+                progress_tracker = TelegramProgressTracker(update, context)
+                ranking_service = self._create_ranking_service(progress_tracker)
                 
                 # Start ranking with filtered keywords
-                result = await self.ranking_service.rank_product_by_keywords(
+                result = await ranking_service.rank_product_by_keywords(
                     product_url=product_url,
-                    keywords_source=relevant_keywords,  # Use filtered keywords instead of file URL
+                    keywords_source=relevant_keywords,  # Use filtered keywords instead of file source
                     output_format="xlsx"
                 )
                 
@@ -824,121 +960,229 @@ class WBRankerBot:
                 await self._send_ranking_results(update, context, result)
                 
         except Exception as e:
-            self.logger.error(f"Error in ranking process with URL: {e}")
+            self.logger.error(f"Error in ranking process: {e}")
             await update.message.reply_text(
-                f"❌ Ошибка при анализе: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при анализе: {e}"
             )
         finally:
-            # Cleanup
-            if user_id in self.active_sessions:
+            # Cleanup, leaving a session started after /cancel in place
+            if self.active_sessions.get(user_id) is session:
                 del self.active_sessions[user_id]
     
+    def _create_ranking_service(self, progress_tracker: ProgressTracker) -> RankingServiceImpl:
+        """Create a ranking service for a single run over the shared search client."""
+        return RankingServiceImpl(
+            settings=self.settings,
+            search_client=self.wb_adapter,
+            file_loader=self.file_loader,
+            file_exporter=self.file_exporter,
+            logger=self.logger,
+            progress_tracker=progress_tracker
+        )
+    
     async def _send_ranking_results(self, update: Update, context: ContextTypes.DEFAULT_TYPE, result) -> None:
         """Send ranking results to user."""
         try:
+            positions = [r.position for r in result.results if r.position is not None]
+            average_position = sum(positions) / len(positions) if positions else 0.0
+            best_position = min(positions) if positions else 'N/A'
+            worst_position = max(positions) if positions else 'N/A'
+            found_percent = (
+                result.found_keywords / result.total_keywords * 100
+                if result.total_keywords > 0 else 0.0
+            )
+            
             # Create summary message
-            summary_text = f"""
-📊 <b>Результаты анализа</b>
+            summary_text = f"""📊 <b>Результаты анализа</b>
 
 🆔 <b>ID товара:</b> {result.product_id}
-📦 <b>Название:</b> {result.product_name}
+📦 <b>Название:</b> {html.escape(result.product_name)}
 🔍 <b>Всего ключевых слов:</b> {result.total_keywords}
 ✅ <b>Найдено:</b> {result.found_keywords}
-    📈 <b>Процент найденных:</b> {(result.found_keywords / result.total_keywords * 100):.1f}% if result.total_keywords > 0 else "0%"
+📈 <b>Процент найденных:</b> {found_percent:.1f}%
 ⏱️ <b>Время выполнения:</b> {result.execution_time_seconds:.1f}с
 
 <b>Статистика:</b>
-• Средняя позиция: {self.ranking_service.get_statistics().get('average_position', 0):.1f}
-• Лучшая позиция: {self.ranking_service.get_statistics().get('best_position', 'N/A')}
-• Худшая позиция: {self.ranking_service.get_statistics().get('worst_position', 'N/A')}
-            """
+• Средняя позиция: {average_position:.1f}
+• Лучшая позиция: {best_position}
+• Худшая позиция: {worst_position}"""
             
-            await update.message.reply_text(summary_text, parse_mode='HTML')
+            # Open the file directly instead of a separate existence check
+            # that could race with the open
+            try:
+                export_file = open(result.export_file_path, 'rb') if result.export_file_path else None
+            except FileNotFoundError:
+                export_file = None
             
-            # Send file if available
-            if result.export_file_path and os.path.exists(result.export_file_path):
+            if export_file is None:
+                await update.message.reply_text(summary_text, parse_mode='HTML')
+                await update.message.reply_text(
+                    "📁 Отчет сохранен локально.\n"
+                    "Файл не найден для отправки."
+                )
+                return
+            
+            with export_file:
+                # Determine file type caption
+                file_extension = os.path.splitext(result.export_file_path)[1].lower()
+                if file_extension == '.csv':
+                    file_caption = "📊 Результаты анализа в формате CSV"
+                else:
+                    file_caption = "📊 Результаты анализа в формате Excel"
+                
+                # Send the summary as the document caption (one request instead
+                # of two) unless it does not fit into a caption
+                caption = f"{summary_text}\n\n{file_caption}"
+                summary_in_caption = len(caption) <= self.CAPTION_MAX_LENGTH
+                if not summary_in_caption:
+                    await update.message.reply_text(summary_text, parse_mode='HTML')
+                    caption = file_caption
+                
                 try:
-                    # Determine file type and caption
-                    file_extension = os.path.splitext(result.export_file_path)[1].lower()
-                    if file_extension == '.csv':
-                        caption = "📊 Результаты анализа в формате CSV"
-                    else:
-                        caption = "📊 Результаты анализа в формате Excel"
-                    
-                    # Send the file
-                    with open(result.export_file_path, 'rb') as file:
-                        await update.message.reply_document(
-                            document=file,
-                            filename=os.path.basename(result.export_file_path),
-                            caption=caption,
-                            parse_mode='HTML'
-                        )
+                    # Send the file, letting the HTTP client stream it from disk
+                    # instead of reading it into memory first
+                    await update.message.reply_document(
+                        document=InputFile(
+                            export_file,
+                            filename=result.export_filename or os.path.basename(result.export_file_path),
+                            read_file_handle=False
+                        ),
+                        caption=caption,
+                        parse_mode='HTML'
+                    )
                     
                     self.logger.info(f"Sent results file to user: {result.export_file_path}")
                     
                 except Exception as e:
                     self.logger.error(f"Error sending file: {e}")
+                    if summary_in_caption:
+                        await update.message.reply_text(summary_text, parse_mode='HTML')
                     await update.message.reply_text(
                         f"❌ Ошибка при отправке файла: {e}\n"
-                        f"Файл сохранен по пути: {result.export_file_path}",
-                        parse_mode='HTML'
+                        f"Файл сохранен по пути: {result.export_file_path}"
                     )
-            else:
-                await update.message.reply_text(
-                    "📁 Отчет сохранен локально.\n"
-                    "Файл не найден для отправки.",
-                    parse_mode='HTML'
-                )
             
         except Exception as e:
             self.logger.error(f"Error sending results: {e}")
             await update.message.reply_text(
-                f"❌ Ошибка при отправке результатов: {e}",
-                parse_mode='HTML'
+                f"❌ Ошибка при отправке результатов: {e}"
             )
     
     def setup_handlers(self) -> None:
         """Setup bot handlers."""
+        # Duplicate update guard (runs before all other handlers)
+        self.application.add_handler(TypeHandler(Update, self.drop_duplicate_update), group=-1)
+        
         # Command handlers
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(CommandHandler("status", self.status_command))
         self.application.add_handler(CommandHandler("cancel", self.cancel_command))
         
-        # Message handlers
-        self.application.add_handler(MessageHandler(filters.Document.ALL, self.handle_document))
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_message))
+        # Message handlers (these can start a ranking, so they run as
+        # background tasks instead of holding up the update dispatcher)
+        self.application.add_handler(MessageHandler(filters.Document.ALL, self.handle_document, block=False))
+        self.application.add_handler(
+            MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_message, block=False)
+        )
         
         # Callback query handler
         self.application.add_handler(CallbackQueryHandler(self.callback_query_handler))
     
+    async def post_init(self, application: Application) -> None:
+        """Initialize components on the application's event loop."""
+        await self.initialize()
+    
+    async def post_shutdown(self, application: Application) -> None:
+        """Release components when the application stops."""
+        await self.shutdown()
+    
     def run(self) -> None:
         """Run the bot (synchronously)."""
+        setup_logging(self.settings.log_level, self.settings.log_format)
+        
         try:
-            # Initialize bot (no awaits needed here)
-            asyncio.run(self.initialize())
+            # Create application (components are initialized in post_init
+            # so that they live on the polling event loop)
+            builder = (
+                Application.builder()
+                .token(self.settings.bot_token)
+                .connection_pool_size(self.settings.tg_connection_pool_size)
+                .pool_timeout(self.settings.tg_pool_timeout)
+                .get_updates_connection_pool_size(self.settings.tg_get_updates_pool_size)
+                .read_timeout(self.settings.tg_read_timeout)
+                .write_timeout(self.settings.tg_write_timeout)
+                .connect_timeout(self.settings.tg_connect_timeout)
+                .concurrent_updates(True)
+                .post_init(self.post_init)
+                .post_shutdown(self.post_shutdown)
+            )
 
-            # Create application
-            self.application = Application.builder().token(self.settings.bot_token).build()
+            # Keep outgoing messages within Telegram's flood limits
+            rate_limiter = _create_rate_limiter()
+            if rate_limiter is not None:
+                builder = builder.rate_limiter(rate_limiter)
+            else:
+                self.logger.warning("AIORateLimiter unavailable, outgoing messages are not rate limited")
+            self.application = builder.build()
 
             # Setup handlers
             self.setup_handlers()
 
             # Start bot (blocking call manages its own event loop)
             self.logger.info("Starting WB Ranker Bot...")
-            self.application.run_polling(
-                drop_pending_updates=True,  # Drop pending updates to avoid conflicts
-                allowed_updates=["message", "callback_query"]  # Only handle these types
-            )
+            allowed_updates = ["message", "callback_query"]  # Only handle these types
+            if self.settings.tg_webhook_url:
+                # Updates are pushed by Telegram instead of being polled
+                secret = self.settings.tg_webhook_secret
+                url_path = secret or ""
+                self.application.run_webhook(
+                    listen=self.settings.tg_webhook_listen,
+                    port=self.settings.tg_webhook_port,
+                    url_path=url_path,
+                    webhook_url=f"{self.settings.tg_webhook_url.rstrip('/')}/{url_path}",
+                    secret_token=secret,
+                    drop_pending_updates=True,
+                    allowed_updates=allowed_updates
+                )
+            else:
+                self.application.run_polling(
+                    drop_pending_updates=True,  # Drop pending updates to avoid conflicts
+                    allowed_updates=allowed_updates
+                )
 
         except Exception as e:
             self.logger.error(f"Failed to run bot: {e}")
             raise
 
 
+def _create_rate_limiter() -> Optional[AIORateLimiter]:
+    """Create the Bot API rate limiter when its optional dependency is installed."""
+    try:
+        return AIORateLimiter()
+    except RuntimeError:
+        # python-telegram-bot was installed without the rate-limiter extra
+        return None
+
+
+def _install_uvloop() -> None:
+    """Use uvloop as the event loop policy when it is available."""
+    if sys.platform == "win32":
+        return
+    
+    try:
+        import uvloop
+    except ImportError:
+        return
+    
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
 def main():
     """Main function to run the bot."""
+    # Faster event loop (must be set before the application creates its loop)
+    _install_uvloop()
+    
     # Load settings
     settings = Settings()
 
@@ -948,11 +1192,5 @@ def main():
 
 
 if __name__ == "__main__":
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
     # Run bot
     main()
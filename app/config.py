@@ -1,5 +1,6 @@
 """Configuration module for WB Ranker Bot."""
 
+from functools import lru_cache
 from typing import Optional
 
 from pydantic import Field, field_validator
@@ -13,12 +14,71 @@ class Settings(BaseSettings):
         env_file=".env",
         env_file_encoding="utf-8",
         case_sensitive=False,
-        validate_assignment=True,
+        frozen=True,
     )
     
     # Telegram Bot Configuration
     bot_token: str = Field(..., description="Telegram bot token")
     
+    # Telegram HTTP Configuration
+    tg_connection_pool_size: int = Field(
+        default=64,
+        ge=1,
+        le=256,
+        description="Connection pool size for Telegram Bot API requests"
+    )
+    tg_get_updates_pool_size: int = Field(
+        default=8,
+        ge=1,
+        le=64,
+        description="Connection pool size for getUpdates requests"
+    )
+    tg_pool_timeout: float = Field(
+        default=20.0,
+        ge=1.0,
+        le=120.0,
+        description="Timeout for acquiring a pooled connection in seconds"
+    )
+    tg_read_timeout: float = Field(
+        default=30.0,
+        ge=1.0,
+        le=120.0,
+        description="Telegram API read timeout in seconds"
+    )
+    tg_write_timeout: float = Field(
+        default=30.0,
+        ge=1.0,
+        le=120.0,
+        description="Telegram API write timeout in seconds"
+    )
+    tg_connect_timeout: float = Field(
+        default=10.0,
+        ge=1.0,
+        le=60.0,
+        description="Telegram API connect timeout in seconds"
+    )
+    
+    # Telegram Webhook Configuration (polling is used when no URL is set)
+    tg_webhook_url: Optional[str] = Field(
+        default=None,
+        description="Public HTTPS base URL for receiving updates via webhook"
+    )
+    tg_webhook_listen: str = Field(
+        default="0.0.0.0",
+        description="Address the webhook server listens on"
+    )
+    tg_webhook_port: int = Field(
+        default=8443,
+        ge=1,
+        le=65535,
+        description="Port the webhook server listens on"
+    )
+    tg_webhook_secret: Optional[str] = Field(
+        default=None,
+        pattern=r"^[A-Za-z0-9_-]{1,256}$",
+        description="Secret used as webhook URL path and secret token"
+    )
+    
     # WB API Configuration
     wb_api_base_url: str = Field(
         default="https://search.wb.ru/exactmatch/ru/common/v5/search",
@@ -66,12 +126,24 @@ class Settings(BaseSettings):
         le=100000,
         description="Maximum number of keywords to process"
     )
+    max_concurrent_rankings: int = Field(
+        default=4,
+        ge=1,
+        le=50,
+        description="Maximum number of ranking sessions processed at once"
+    )
     max_execution_time_minutes: int = Field(
         default=30,
         ge=1,
         le=120,
         description="Maximum execution time in minutes"
     )
+    export_process_workers: int = Field(
+        default=2,
+        ge=0,
+        le=16,
+        description="Worker processes for writing large XLSX exports (0 disables)"
+    )
     
     # Logging Configuration
     log_level: str = Field(
@@ -82,6 +154,10 @@ class Settings(BaseSettings):
         default="json",
         description="Log format (json or text)"
     )
+    tg_log_level: str = Field(
+        default="ERROR",
+        description="Minimum level of log messages mirrored to Telegram"
+    )
     
     # Output Configuration
     output_directory: str = Field(
@@ -89,7 +165,7 @@ class Settings(BaseSettings):
         description="Directory for output files"
     )
     
-    @field_validator("log_level")
+    @field_validator("log_level", "tg_log_level")
     @classmethod
     def validate_log_level(cls, v: str) -> str:
         """Validate log level."""
@@ -119,6 +195,7 @@ class Settings(BaseSettings):
         return v
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Get application settings instance."""
+    """Get application settings instance (loaded and validated once)."""
     return Settings()
\ No newline at end of file
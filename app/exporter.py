@@ -1,12 +1,16 @@
 """Export functionality for ranking results."""
 
+import asyncio
 import csv
 import os
+import time
+from concurrent.futures import Executor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Set
 
-import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 
 from app.config import Settings
 from app.ports import FileExporter, RankingResult, Logger
@@ -16,9 +20,34 @@ from app.utils import format_execution_time, truncate_string
 class FileExporterImpl(FileExporter):
     """File exporter implementation for CSV and XLSX formats."""
     
-    def __init__(self, settings: Settings, logger: Logger):
+    # Column headers of the main results table
+    RESULT_HEADERS = (
+        'Номер строки',
+        'Ключевое слово',
+        'Частотность',
+        'Позиция товара',
+        'Цена товара'
+    )
+    # Excel number formats for numeric cells
+    MONEY_FORMAT = '#,##0.00 "₽"'
+    PERCENT_FORMAT = '0.0%'
+    DECIMAL_FORMAT = '0.0'
+    # Write buffer size for CSV export (bytes)
+    CSV_BUFFER_SIZE = 1 << 20
+    # Minimum number of results for writing XLSX in the process pool
+    PROCESS_POOL_MIN_RESULTS = 2000
+    
+    def __init__(
+        self,
+        settings: Settings,
+        logger: Logger,
+        process_pool: Optional[Executor] = None,
+    ):
         self.settings = settings
         self.logger = logger
+        self.process_pool = process_pool
+        # Directories already created by this exporter
+        self._ensured_dirs: Set[str] = set()
     
     async def export_to_csv(
         self, 
@@ -38,31 +67,30 @@ class FileExporterImpl(FileExporter):
         self.logger.info(f"Exporting results to CSV: {file_path}")
         
         try:
-            # Ensure output directory exists
-            output_dir = Path(file_path).parent
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Prepare data for CSV
-            csv_data = self._prepare_csv_data(result)
-            
-            # Write CSV file
-            with open(file_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # Write header
-                writer.writerow(csv_data['headers'])
-                
-                # Write data rows
-                for row in csv_data['rows']:
-                    writer.writerow(row)
+            row_count = await self._write_to_dir(
+                file_path, asyncio.to_thread, self._write_csv_sync, result, file_path
+            )
             
-            self.logger.info(f"Successfully exported {len(csv_data['rows'])} rows to CSV")
+            self.logger.info(f"Successfully exported {row_count} rows to CSV")
             return file_path
             
         except Exception as e:
             self.logger.error(f"Failed to export to CSV: {e}")
             raise ValueError(f"Failed to export to CSV: {e}")
     
+    def _write_csv_sync(self, result: RankingResult, file_path: str) -> int:
+        """Write CSV file (blocking, run in a worker thread)."""
+        # Prepare data for CSV
+        csv_data = self._prepare_csv_data(result)
+        
+        # Write CSV file through a large buffer in as few calls as possible
+        with open(file_path, 'w', newline='', encoding='utf-8-sig', buffering=self.CSV_BUFFER_SIZE) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(csv_data['headers'])
+            writer.writerows(csv_data['rows'])
+        
+        return len(csv_data['rows'])
+    
     async def export_to_xlsx(
         self, 
         result: RankingResult, 
@@ -81,195 +109,210 @@ class FileExporterImpl(FileExporter):
         self.logger.info(f"Exporting results to XLSX: {file_path}")
         
         try:
-            # Ensure output directory exists
-            output_dir = Path(file_path).parent
-            output_dir.mkdir(parents=True, exist_ok=True)
+            result_count = await self._write_to_dir(file_path, self._write_xlsx, result, file_path)
             
-            # Prepare data for Excel
-            excel_data = self._prepare_excel_data(result)
-            
-            # Create Excel writer
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                # Write main results sheet
-                df_results = pd.DataFrame(excel_data['results'])
-                df_results.to_excel(
-                    writer, 
-                    sheet_name='Результаты поиска', 
-                    index=False
-                )
-                
-                # Write summary sheet
-                df_summary = pd.DataFrame(excel_data['summary'])
-                df_summary.to_excel(
-                    writer, 
-                    sheet_name='Сводка', 
-                    index=False
-                )
-                
-                # Write statistics sheet
-                df_stats = pd.DataFrame(excel_data['statistics'])
-                df_stats.to_excel(
-                    writer, 
-                    sheet_name='Статистика', 
-                    index=False
-                )
-            
-            self.logger.info(f"Successfully exported to XLSX with {len(excel_data['results'])} results")
+            self.logger.info(f"Successfully exported to XLSX with {result_count} results")
             return file_path
             
         except Exception as e:
             self.logger.error(f"Failed to export to XLSX: {e}")
             raise ValueError(f"Failed to export to XLSX: {e}")
     
-    def _prepare_csv_data(self, result: RankingResult) -> dict:
-        """Prepare data for CSV export."""
-        headers = [
-            'Номер строки',
-            'Ключевое слово',
-            'Частотность',
-            'Позиция товара',
-            'Цена товара'
-        ]
+    async def _write_xlsx(self, result: RankingResult, file_path: str) -> int:
+        """Write XLSX file in a worker thread, or a worker process for large results."""
+        if self.process_pool is not None and len(result.results) >= self.PROCESS_POOL_MIN_RESULTS:
+            # Large workbooks are CPU bound (XML + zlib), so write them in
+            # a worker process instead of a thread holding the GIL
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.process_pool, _write_xlsx_file, result, file_path)
         
-        rows = []
+        return await asyncio.to_thread(self._write_xlsx_sync, result, file_path)
+    
+    @classmethod
+    def _write_xlsx_sync(cls, result: RankingResult, file_path: str) -> int:
+        """Write XLSX file (blocking, run in a worker thread or process)."""
+        # Stream rows into a write-only workbook instead of building
+        # DataFrames and a full in-memory workbook
+        workbook = Workbook(write_only=True)
+        result_count = 0
+        
+        # Write main results sheet
+        sheet = workbook.create_sheet('Результаты поиска')
+        sheet.append(cls.RESULT_HEADERS)
+        for row in cls._iter_result_rows(result):
+            row[4] = cls._formatted_cell(sheet, row[4], cls.MONEY_FORMAT)
+            sheet.append(row)
+            result_count += 1
+        
+        # Write summary sheet
+        sheet = workbook.create_sheet('Сводка')
+        sheet.append(['Параметр', 'Значение'])
+        for name, value, number_format in cls._prepare_summary_data(result):
+            sheet.append([name, cls._formatted_cell(sheet, value, number_format)])
+        
+        # Write statistics sheet
+        sheet = workbook.create_sheet('Статистика')
+        sheet.append(['Метрика', 'Значение'])
+        for name, value, number_format in cls._prepare_statistics_data(result):
+            sheet.append([name, cls._formatted_cell(sheet, value, number_format)])
+        
+        workbook.save(file_path)
+        
+        return result_count
+    
+    @staticmethod
+    def _formatted_cell(sheet, value, number_format: Optional[str]):
+        """Wrap a numeric value in a cell with the given Excel number format."""
+        if number_format is None:
+            return value
+        
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = number_format
+        return cell
+    
+    def _ensure_dir(self, directory: Path) -> None:
+        """Create directory unless it was already created by this exporter."""
+        key = str(directory)
+        if key not in self._ensured_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._ensured_dirs.add(key)
+    
+    async def _write_to_dir(
+        self,
+        file_path: str,
+        write: Callable[..., Awaitable[int]],
+        *args: Any
+    ) -> int:
+        """Run an export write, recreating its directory once if it was removed after being cached."""
+        directory = Path(file_path).parent
+        self._ensure_dir(directory)
+        
+        try:
+            return await write(*args)
+        except FileNotFoundError:
+            self.logger.warning(f"Output directory {directory} is missing, creating it again")
+            self._ensured_dirs.discard(str(directory))
+            self._ensure_dir(directory)
+            return await write(*args)
+    
+    @staticmethod
+    def _iter_result_rows(result: RankingResult) -> Iterator[list]:
+        """Yield export rows for found products, numbered from 1."""
         row_number = 1
         
         # Only include found products (filter out "Не найден")
         for search_result in result.results:
             if search_result.product and search_result.position is not None:  # Only include found products with positions
-                row = [
+                yield [
                     row_number,
                     search_result.keyword,
                     'Найден',
                     search_result.position,
-                    f"{search_result.product.price_rub:.2f} ₽"
+                    search_result.product.price_rub
                 ]
-                rows.append(row)
                 row_number += 1
+    
+    def _prepare_csv_data(self, result: RankingResult) -> dict:
+        """Prepare data for CSV export."""
+        rows = []
+        for row in self._iter_result_rows(result):
+            # CSV has no cell formats, so prices are written as text
+            row[4] = f"{row[4]:.2f} ₽"
+            rows.append(row)
         
         return {
-            'headers': headers,
+            'headers': list(self.RESULT_HEADERS),
             'rows': rows
         }
     
-    def _prepare_excel_data(self, result: RankingResult) -> dict:
-        """Prepare data for Excel export."""
-        # Main results data - only include found products
-        results_data = []
-        row_number = 1
+    @classmethod
+    def _prepare_summary_data(cls, result: RankingResult) -> List[tuple]:
+        """Prepare (parameter, value, number format) rows for the summary sheet."""
+        found_ratio = result.found_keywords / result.total_keywords if result.total_keywords > 0 else 0.0
         
-        for search_result in result.results:
-            if search_result.product and search_result.position is not None:  # Only include found products with positions
-                # Verify that we found the correct product by checking if it matches our target
-                # This is a critical fix to ensure we're showing the right product data
-                results_data.append({
-                    'Номер строки': row_number,
-                    'Ключевое слово': search_result.keyword,
-                    'Частотность': 'Найден',
-                    'Позиция товара': search_result.position,
-                    'Цена товара': f"{search_result.product.price_rub:.2f} ₽"
-                })
-                row_number += 1
-        
-        # Summary data
-        summary_data = [
-            {
-                'Параметр': 'ID товара',
-                'Значение': result.product_id
-            },
-            {
-                'Параметр': 'Название товара',
-                'Значение': truncate_string(result.product_name, 50)
-            },
-            {
-                'Параметр': 'Общее количество ключевых слов',
-                'Значение': result.total_keywords
-            },
-            {
-                'Параметр': 'Найдено товаров',
-                'Значение': result.found_keywords
-            },
-            {
-                'Параметр': 'Процент найденных',
-                'Значение': f"{(result.found_keywords / result.total_keywords * 100):.1f}%" if result.total_keywords > 0 else "0%"
-            },
-            {
-                'Параметр': 'Время выполнения',
-                'Значение': format_execution_time(result.execution_time_seconds)
-            },
-            {
-                'Параметр': 'Дата создания отчета',
-                'Значение': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+        return [
+            ('ID товара', result.product_id, None),
+            ('Название товара', truncate_string(result.product_name, 50), None),
+            ('Общее количество ключевых слов', result.total_keywords, None),
+            ('Найдено товаров', result.found_keywords, None),
+            ('Процент найденных', found_ratio, cls.PERCENT_FORMAT),
+            ('Время выполнения', format_execution_time(result.execution_time_seconds), None),
+            ('Дата создания отчета', datetime.now().strftime('%Y-%m-%d %H:%M:%S'), None),
         ]
-        
-        # Statistics data
+    
+    @classmethod
+    def _prepare_statistics_data(cls, result: RankingResult) -> List[tuple]:
+        """Prepare (metric, value, number format) rows for the statistics sheet."""
         statistics_data = []
         
-        if result.results:
-            # Position statistics
-            positions = [r.position for r in result.results if r.position is not None]
-            if positions:
-                statistics_data.extend([
-                    {
-                        'Метрика': 'Средняя позиция',
-                        'Значение': f"{sum(positions) / len(positions):.1f}"
-                    },
-                    {
-                        'Метрика': 'Лучшая позиция',
-                        'Значение': min(positions)
-                    },
-                    {
-                        'Метрика': 'Худшая позиция',
-                        'Значение': max(positions)
-                    }
-                ])
+        # Collect all aggregates in a single pass over the results
+        position_sum = position_count = 0
+        position_min = position_max = None
+        price_sum = 0.0
+        price_count = 0
+        price_min = price_max = None
+        page_sum = page_count = 0
+        page_max = None
+        error_count = 0
+        
+        for r in result.results:
+            position = r.position
+            if position is not None:
+                position_sum += position
+                position_count += 1
+                if position_min is None or position < position_min:
+                    position_min = position
+                if position_max is None or position > position_max:
+                    position_max = position
             
-            # Price statistics
-            prices = [r.product.price_rub for r in result.results if r.product]
-            if prices:
-                statistics_data.extend([
-                    {
-                        'Метрика': 'Средняя цена',
-                        'Значение': f"{sum(prices) / len(prices):.2f} ₽"
-                    },
-                    {
-                        'Метрика': 'Минимальная цена',
-                        'Значение': f"{min(prices):.2f} ₽"
-                    },
-                    {
-                        'Метрика': 'Максимальная цена',
-                        'Значение': f"{max(prices):.2f} ₽"
-                    }
-                ])
+            product = r.product
+            if product:
+                price = product.price_rub
+                price_sum += price
+                price_count += 1
+                if price_min is None or price < price_min:
+                    price_min = price
+                if price_max is None or price > price_max:
+                    price_max = price
             
-            # Page statistics
-            pages = [r.page for r in result.results if r.page is not None]
-            if pages:
-                statistics_data.extend([
-                    {
-                        'Метрика': 'Средняя страница',
-                        'Значение': f"{sum(pages) / len(pages):.1f}"
-                    },
-                    {
-                        'Метрика': 'Максимальная страница',
-                        'Значение': max(pages)
-                    }
-                ])
+            page = r.page
+            if page is not None:
+                page_sum += page
+                page_count += 1
+                if page_max is None or page > page_max:
+                    page_max = page
             
-            # Error statistics
-            errors = [r for r in result.results if r.error]
-            if errors:
-                statistics_data.append({
-                    'Метрика': 'Количество ошибок',
-                    'Значение': len(errors)
-                })
+            if r.error:
+                error_count += 1
         
-        return {
-            'results': results_data,
-            'summary': summary_data,
-            'statistics': statistics_data
-        }
+        # Position statistics
+        if position_count:
+            statistics_data.extend([
+                ('Средняя позиция', position_sum / position_count, cls.DECIMAL_FORMAT),
+                ('Лучшая позиция', position_min, None),
+                ('Худшая позиция', position_max, None),
+            ])
+        
+        # Price statistics
+        if price_count:
+            statistics_data.extend([
+                ('Средняя цена', price_sum / price_count, cls.MONEY_FORMAT),
+                ('Минимальная цена', price_min, cls.MONEY_FORMAT),
+                ('Максимальная цена', price_max, cls.MONEY_FORMAT),
+            ])
+        
+        # Page statistics
+        if page_count:
+            statistics_data.extend([
+                ('Средняя страница', page_sum / page_count, cls.DECIMAL_FORMAT),
+                ('Максимальная страница', page_max, None),
+            ])
+        
+        # Error statistics
+        if error_count:
+            statistics_data.append(('Количество ошибок', error_count, None))
+        
+        return statistics_data
     
     def generate_filename(
         self, 
@@ -316,7 +359,7 @@ class FileExporterImpl(FileExporter):
         if subdirectory:
             output_dir = output_dir / subdirectory
         
-        output_dir.mkdir(parents=True, exist_ok=True)
+        self._ensure_dir(output_dir)
         
         return str(output_dir / filename)
     
@@ -331,12 +374,11 @@ class FileExporterImpl(FileExporter):
             True if valid
         """
         try:
-            path = Path(file_path)
-            
-            # Check if parent directory exists or can be created
-            parent = path.parent
-            if not parent.exists():
-                parent.mkdir(parents=True, exist_ok=True)
+            # Missing directories are created on export, so check the
+            # nearest existing one without touching the filesystem
+            parent = Path(file_path).absolute().parent
+            while not parent.exists() and parent != parent.parent:
+                parent = parent.parent
             
             # Check if we can write to the directory
             if not os.access(parent, os.W_OK):
@@ -374,26 +416,33 @@ class FileExporterImpl(FileExporter):
             Number of files deleted
         """
         try:
-            import time
-            
             deleted_count = 0
-            current_time = time.time()
-            max_age_seconds = max_age_days * 24 * 60 * 60
+            cutoff_time = time.time() - max_age_days * 24 * 60 * 60
             
-            for file_path in Path(directory).glob("wb_ranking_*"):
-                if file_path.is_file():
-                    file_age = current_time - file_path.stat().st_mtime
+            # DirEntry caches the file type, so only the mtime needs a stat call
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.startswith("wb_ranking_") or not entry.is_file():
+                        continue
                     
-                    if file_age > max_age_seconds:
-                        file_path.unlink()
+                    if entry.stat().st_mtime < cutoff_time:
+                        os.unlink(entry.path)
                         deleted_count += 1
-                        self.logger.info(f"Deleted old file: {file_path}")
+                        self.logger.info(f"Deleted old file: {entry.path}")
             
             if deleted_count > 0:
                 self.logger.info(f"Cleaned up {deleted_count} old files")
             
             return deleted_count
             
+        except FileNotFoundError:
+            # Nothing has been exported yet
+            return 0
         except Exception as e:
             self.logger.error(f"Failed to cleanup old files: {e}")
             return 0
+
+
+def _write_xlsx_file(result: RankingResult, file_path: str) -> int:
+    """Write XLSX file in a worker process (module level so it can be pickled)."""
+    return FileExporterImpl._write_xlsx_sync(result, file_path)
@@ -1,11 +1,16 @@
 """File I/O operations for loading and parsing keyword files."""
 
 import asyncio
+import codecs
 import csv
 import io
 import os
+import re
+import tempfile
+import zipfile
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from urllib.parse import urlparse
 
 import aiohttp
@@ -14,21 +19,96 @@ import pandas as pd
 from app.config import Settings
 from app.ports import FileLoader, Logger
 from app.utils import (
-    clean_keyword,
+    async_retry_with_backoff,
+    clean_keyword_vec,
     convert_google_drive_url,
     extract_filename_from_url,
     is_google_drive_url,
-    retry_with_backoff,
-    validate_keyword,
+    validate_keyword_vec,
 )
 
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE: Optional[str] = "calamine"
+except ImportError:  # pragma: no cover - optional speedup
+    EXCEL_ENGINE = None
+
+# Column headers marking the keywords column of a sheet
+KEYWORDS_SHEET_HEADER_RE = re.compile(r'поисковый|запрос|keyword|ключевое|слово', re.IGNORECASE)
+KEYWORDS_COLUMN_HEADER_RE = re.compile(r'ключевое|keyword|слово|запрос', re.IGNORECASE)
+
+# Cell values containing any of these words are report headers, not keywords
+SKIP_WORDS = ('период', 'period', 'выбранный', 'предыдущий', 'аналитика', 'сводка', 'статистика')
+SKIP_RE = re.compile('|'.join(map(re.escape, SKIP_WORDS)), re.IGNORECASE)
+
+
+def _cell_text(value) -> str:
+    """Render an Excel cell value as text the way pandas does with dtype=str."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
 
 class FileLoaderImpl(FileLoader):
     """File loader implementation supporting CSV, XLSX, and URL downloads."""
     
+    # Rows parsed per sheet while looking for the keywords column
+    SHEET_PROBE_ROWS = 10
+    # Sheets probed concurrently in worker threads
+    SHEET_PROBE_CONCURRENCY = 4
+    
+    # Keywords column scores, highest wins; ties go to the leftmost column
+    SCORE_KEYWORDS_SHEET = 3
+    SCORE_KEYWORDS_HEADER = 2
+    SCORE_TEXT_LIKE = 1
+    SCORE_NONE = 0
+    
+    # Chunk size for streaming downloads to disk (bytes)
+    DOWNLOAD_CHUNK_SIZE = 1 << 16
+    # Leading bytes inspected when the URL does not reveal the file type
+    DETECT_HEAD_SIZE = 1024
+    # ZIP local file, empty archive and spanned archive headers (XLSX is a ZIP container)
+    ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06', b'PK\x07\x08')
+    
+    # Encodings tried in order when reading CSV files and content
+    CSV_ENCODINGS = (('utf-8-sig', 'strict'), ('cp1251', 'strict'), ('utf-8', 'ignore'))
+    # Rows validated per vectorized batch; parsing stops after the batch that passes the keywords limit
+    KEYWORD_BATCH_SIZE = 10000
+    # Largest keywords file accepted (bytes)
+    MAX_FILE_SIZE = 10 * 1024 * 1024
+    # Invalid rows quoted in the summary warning
+    INVALID_SAMPLES_LOGGED = 10
+    # Leading bytes decoded to rule out UTF-8 before reading the whole CSV
+    ENCODING_SNIFF_SIZE = 4096
+    
     def __init__(self, settings: Settings, logger: Logger):
         self.settings = settings
         self.logger = logger
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.close()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared download session, creating it on first use."""
+        if self._session is None:
+            timeout = aiohttp.ClientTimeout(total=30)
+            connector = aiohttp.TCPConnector(limit=16, limit_per_host=8, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        return self._session
+    
+    async def close(self) -> None:
+        """Close the shared download session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
     
     async def load_keywords_from_file(self, file_path: str) -> List[str]:
         """
@@ -49,6 +129,9 @@ class FileLoaderImpl(FileLoader):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
+        if not self.validate_file_size(file_path):
+            raise ValueError(f"File is too large: {file_path}")
+        
         file_extension = Path(file_path).suffix.lower()
         
         try:
@@ -78,169 +161,126 @@ class FileLoaderImpl(FileLoader):
         """
         self.logger.info(f"Loading keywords from URL: {url}")
         
+        temp_path = None
         try:
-            # Download file content
-            content = await self._download_file(url)
+            # Download file content to a temporary file
+            temp_path, head = await self._download_file(url)
             
-            # Determine file type from URL or content
-            file_type = self._detect_file_type(url, content)
+            # Determine file type from URL or the leading bytes captured during download
+            file_type = self._detect_file_type(url, head)
             
             # Parse content based on file type
             if file_type == 'csv':
-                return await self._parse_csv_content(content)
+                return await self._load_from_csv(temp_path)
             elif file_type == 'excel':
-                return await self._parse_excel_content(content)
+                return await self._parse_excel_content(temp_path)
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
                 
         except Exception as e:
             self.logger.error(f"Failed to load keywords from URL {url}: {e}")
             raise ValueError(f"Failed to download or parse file from URL {url}: {e}")
+        finally:
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
     
-    async def _load_from_csv(self, file_path: str) -> List[str]:
-        """Load keywords from CSV file."""
-        keywords = []
+    async def load_keywords_from_bytes(self, file_name: str, content: Union[bytes, bytearray]) -> List[str]:
+        """
+        Load keywords from in-memory file content (CSV/XLSX).
         
-        try:
-            with open(file_path, 'r', encoding='utf-8-sig') as file:
-                reader = csv.reader(file)
-                
-                for row_num, row in enumerate(reader, 1):
-                    if not row:  # Skip empty rows
-                        continue
-                    
-                    # Take the first column as keyword
-                    keyword = row[0].strip()
-                    
-                    if keyword and validate_keyword(keyword):
-                        cleaned_keyword = clean_keyword(keyword)
-                        keywords.append(cleaned_keyword)
-                    elif keyword:
-                        self.logger.warning(
-                            f"Invalid keyword in row {row_num}: '{keyword}'",
-                            row_number=row_num,
-                            keyword=keyword
-                        )
+        Args:
+            file_name: Original file name used to detect the format
+            content: File content
             
-            self.logger.info(f"Loaded {len(keywords)} keywords from CSV file")
-            return keywords
+        Returns:
+            List of keywords
             
-        except UnicodeDecodeError:
-            # Try with different encoding
-            with open(file_path, 'r', encoding='cp1251') as file:
-                reader = csv.reader(file)
+        Raises:
+            ValueError: If file format is invalid or file is too large
+        """
+        self.logger.info(f"Loading keywords from uploaded file: {file_name}")
+        
+        if len(content) > self.MAX_FILE_SIZE:
+            raise ValueError(f"File is too large: {file_name}")
+        
+        file_extension = Path(file_name).suffix.lower()
+        
+        try:
+            if file_extension == '.csv':
+                return await self._parse_csv_content(content)
+            elif file_extension in ['.xlsx', '.xls']:
+                return await self._parse_excel_content(content)
+            else:
+                raise ValueError(f"Unsupported file format: {file_extension}")
                 
-                for row_num, row in enumerate(reader, 1):
-                    if not row:
-                        continue
-                    
-                    keyword = row[0].strip()
-                    if keyword and validate_keyword(keyword):
-                        cleaned_keyword = clean_keyword(keyword)
-                        keywords.append(cleaned_keyword)
-            
-            self.logger.info(f"Loaded {len(keywords)} keywords from CSV file (cp1251)")
-            return keywords
+        except Exception as e:
+            self.logger.error(f"Failed to load keywords from uploaded file {file_name}: {e}")
+            raise ValueError(f"Failed to parse file {file_name}: {e}")
+    
+    async def _load_from_csv(self, file_path: str) -> List[str]:
+        """Load keywords from CSV file."""
+        keywords, encoding = await self._decode_csv_keywords(file_path)
+        self.logger.info(f"Loaded {len(keywords)} keywords from CSV file ({encoding})")
+        return keywords
     
     async def _load_from_excel(self, file_path: str) -> List[str]:
         """Load keywords from Excel file."""
+        return await self._load_from_workbook(file_path)
+    
+    async def _load_from_workbook(self, source: Union[str, bytes]) -> List[str]:
+        """Load keywords from an Excel workbook path or bytes, probing sheet headers first."""
+        xl = None
         try:
-            # First, check all sheets to find the one with keywords
-            xl = pd.ExcelFile(file_path)
+            # Parsing is CPU-bound, so it runs in worker threads to keep the event loop responsive
+            xl = await asyncio.to_thread(self._open_workbook, source)
             self.logger.info(f"Excel file has {len(xl.sheet_names)} sheets: {xl.sheet_names}")
             
-            keywords_sheet = None
-            keywords_column = None
+            # Score the columns of each sheet from a small probe
+            if len(xl.sheet_names) > 1:
+                probes = await self._probe_sheets(source, xl.sheet_names)
+            else:
+                probes = [await asyncio.to_thread(self._probe_sheet, xl, xl.sheet_names[0])]
             
-            # Look for sheet with keywords
-            for sheet_name in xl.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                if df.empty:
-                    continue
-                
-                # Check if this sheet has a column with keywords
-                for col in df.columns:
-                    col_str = str(col).strip().lower()
-                    if any(keyword in col_str for keyword in ['поисковый', 'запрос', 'keyword', 'ключевое', 'слово']):
-                        # Check if this column has actual keyword data (not just headers)
-                        non_null_values = df[col].dropna()
-                        if len(non_null_values) > 1:  # More than just header
-                            # Check if values look like keywords
-                            sample_values = non_null_values.head(10)
-                            text_like_count = sum(1 for val in sample_values if isinstance(val, str) and len(str(val).strip()) > 2)
-                            if text_like_count >= len(sample_values) * 0.7:  # 70% text-like
-                                keywords_sheet = sheet_name
-                                keywords_column = col
-                                self.logger.info(f"Found keywords in sheet '{sheet_name}', column '{col}' with {len(non_null_values)} values")
-                                break
-                
-                if keywords_sheet:
+            keywords_sheet = None
+            keywords_column_index = None
+            first_sheet_probe = None
+            for sheet_name, (column_index, score) in zip(xl.sheet_names, probes):
+                if first_sheet_probe is None:
+                    first_sheet_probe = (column_index, score)
+                if score == self.SCORE_KEYWORDS_SHEET:
+                    keywords_sheet = sheet_name
+                    keywords_column_index = column_index
+                    self.logger.info(f"Found keywords in sheet '{sheet_name}', column #{column_index + 1}")
                     break
             
-            # If no keywords sheet found, use first sheet
+            # If no keywords sheet found, use the best column of the first sheet
             if keywords_sheet is None:
                 keywords_sheet = xl.sheet_names[0]
+                keywords_column_index, score = first_sheet_probe
                 self.logger.warning(f"No keywords sheet found, using first sheet: '{keywords_sheet}'")
-            
-            # Read the selected sheet
-            df = pd.read_excel(file_path, sheet_name=keywords_sheet)
-            
-            if df.empty:
+                if score == self.SCORE_KEYWORDS_HEADER:
+                    self.logger.info(f"Found keywords column #{keywords_column_index + 1}")
+                elif score == self.SCORE_TEXT_LIKE:
+                    self.logger.info(f"Using first text-like column #{keywords_column_index + 1}")
+                else:
+                    self.logger.warning("No suitable keywords column found, using first column")
+            
+            column = await asyncio.to_thread(self._read_keywords_column, xl, keywords_sheet, keywords_column_index)
+            if column is None:
                 self.logger.warning(f"Sheet '{keywords_sheet}' is empty")
                 return []
             
-            # If no keywords column found, try to find it
-            if keywords_column is None:
-                # First, try to find column with header "Ключевое слово" or similar
-                for col in df.columns:
-                    col_str = str(col).strip().lower()
-                    if any(keyword in col_str for keyword in ['ключевое', 'keyword', 'слово', 'запрос']):
-                        keywords_column = col
-                        self.logger.info(f"Found keywords column: '{col}'")
-                        break
-                
-                # If not found, look for the first column that contains text data
-                if keywords_column is None:
-                    for col in df.columns:
-                        # Check if column contains mostly text data
-                        non_null_count = df[col].notna().sum()
-                        if non_null_count > 0:
-                            # Check if values look like keywords (not numbers, not dates)
-                            sample_values = df[col].dropna().head(5)
-                            if len(sample_values) > 0:
-                                text_like_count = sum(1 for val in sample_values if isinstance(val, str) and len(str(val).strip()) > 2)
-                                if text_like_count >= len(sample_values) * 0.6:  # 60% text-like
-                                    keywords_column = col
-                                    self.logger.info(f"Using first text-like column: '{col}'")
-                                    break
-                
-                # Fallback to first column
-                if keywords_column is None:
-                    keywords_column = df.columns[0]
-                    self.logger.warning(f"No suitable keywords column found, using first column: '{keywords_column}'")
-            
-            # Extract keywords from the found column
-            keywords = []
-            for row_num, value in enumerate(df[keywords_column], 1):
-                if pd.isna(value):
-                    continue
-                
-                keyword = str(value).strip()
-                
-                # Skip obvious non-keywords (periods, headers, etc.)
-                if any(skip_word in keyword.lower() for skip_word in ['период', 'period', 'выбранный', 'предыдущий', 'аналитика', 'сводка', 'статистика']):
-                    self.logger.warning(f"Skipping non-keyword in row {row_num}: '{keyword}'")
-                    continue
-                
-                if keyword and validate_keyword(keyword):
-                    cleaned_keyword = clean_keyword(keyword)
-                    keywords.append(cleaned_keyword)
-                elif keyword:
-                    self.logger.warning(
-                        f"Invalid keyword in row {row_num}: '{keyword}'",
-                        row_number=row_num,
-                        keyword=keyword
-                    )
+            keywords, invalid_rows, skipped_count = await asyncio.to_thread(
+                self._collect_keywords,
+                self._iter_column_fields(column),
+                self.settings.max_keywords_limit,
+                True
+            )
+            keywords_column = column.name
+            self._warn_dropped_rows(invalid_rows, skipped_count)
             
             # Log first 5 keywords for debugging
             if keywords:
@@ -249,7 +289,7 @@ class FileLoaderImpl(FileLoader):
             else:
                 self.logger.warning("No valid keywords found in Excel file!")
                 # Log all values for debugging
-                all_values = [str(val).strip() for val in df[keywords_column].dropna()]
+                all_values = [str(val).strip() for val in column.dropna()]
                 self.logger.warning(f"All values in column '{keywords_column}': {all_values}")
             
             self.logger.info(f"Loaded {len(keywords)} keywords from Excel file")
@@ -257,9 +297,103 @@ class FileLoaderImpl(FileLoader):
             
         except Exception as e:
             raise ValueError(f"Failed to read Excel file: {e}")
+        finally:
+            if xl is not None:
+                xl.close()
+    
+    @classmethod
+    def _read_keywords_column(cls, xl: pd.ExcelFile, sheet_name: str, column_index: Optional[int]) -> Optional[pd.Series]:
+        """Read only the chosen column of the selected sheet in full, the first one by default."""
+        column_index = 0 if column_index is None else column_index
+        if xl.engine == 'openpyxl':
+            worksheet = xl.book[sheet_name]
+            rows = worksheet.iter_rows(min_col=column_index + 1, max_col=column_index + 1, values_only=True)
+            return cls._column_from_rows(rows, column_index)
+        
+        # Other engines (calamine included) go through the public parse API;
+        # keywords are treated as text, so skip dtype inference and NA detection
+        df = xl.parse(sheet_name=sheet_name, usecols=[column_index], dtype=str, na_filter=False)
+        if df.empty:
+            return None
+        return df.iloc[:, 0]
+    
+    @staticmethod
+    def _column_from_rows(rows: Iterator[Sequence], column_index: int) -> Optional[pd.Series]:
+        """Collect single-cell sheet rows as text, using the first row as the column header."""
+        header = next(rows, None)
+        if header is None:
+            return None
+        
+        values = [_cell_text(row[0]) for row in rows]
+        if not any(values):
+            return None
+        
+        name = header[0]
+        if name is None or name == '':
+            name = f"Unnamed: {column_index}"
+        return pd.Series(values, name=name, dtype=object)
+    
+    @staticmethod
+    def _iter_column_fields(column: pd.Series) -> Iterator[Tuple[int, str]]:
+        """Yield (sheet row, stripped value) pairs from a keywords column below its header."""
+        return enumerate(column.astype(str).str.strip(), 2)
+    
+    @staticmethod
+    def _open_workbook(source: Union[str, bytes]) -> pd.ExcelFile:
+        """Open an Excel workbook from a path or bytes."""
+        return pd.ExcelFile(source if isinstance(source, str) else io.BytesIO(source), engine=EXCEL_ENGINE)
+    
+    async def _probe_sheets(self, source: Union[str, bytes], sheet_names: List[str]) -> List[Tuple[Optional[int], int]]:
+        """Probe sheets concurrently in worker threads, each on its own workbook handle."""
+        semaphore = asyncio.Semaphore(self.SHEET_PROBE_CONCURRENCY)
+        
+        def probe(sheet_name: str) -> Tuple[Optional[int], int]:
+            # Workbook handles are not thread-safe, so every probe opens its own
+            with self._open_workbook(source) as xl:
+                return self._probe_sheet(xl, sheet_name)
+        
+        async def probe_limited(sheet_name: str) -> Tuple[Optional[int], int]:
+            async with semaphore:
+                return await asyncio.to_thread(probe, sheet_name)
+        
+        return await asyncio.gather(*(probe_limited(name) for name in sheet_names))
+    
+    def _probe_sheet(self, xl: pd.ExcelFile, sheet_name: str) -> Tuple[Optional[int], int]:
+        """Return the position and score of the best keywords column in a sheet probe."""
+        df_head = xl.parse(sheet_name=sheet_name, nrows=self.SHEET_PROBE_ROWS)
+        if len(df_head.columns) == 0:
+            return None, self.SCORE_NONE
+        
+        # Normalise every header once instead of per pattern check
+        headers = [str(col).strip() for col in df_head.columns]
+        scores = [
+            self._score_column(header, df_head.iloc[:, col_index])
+            for col_index, header in enumerate(headers)
+        ]
+        best_index = max(range(len(scores)), key=scores.__getitem__)
+        return best_index, scores[best_index]
+    
+    @classmethod
+    def _score_column(cls, header: str, sample: pd.Series) -> int:
+        """Score how likely a column holds keywords from its header and sampled values."""
+        values = sample.dropna()
+        text_like = [isinstance(val, str) and len(val.strip()) > 2 for val in values]
+        
+        # Keyword-like header backed by mostly text data (more than just a header)
+        if (KEYWORDS_SHEET_HEADER_RE.search(header) and len(values) > 1
+                and sum(text_like) >= len(values) * 0.7):
+            return cls.SCORE_KEYWORDS_SHEET
+        if KEYWORDS_COLUMN_HEADER_RE.search(header):
+            return cls.SCORE_KEYWORDS_HEADER
+        
+        # Mostly text values (not numbers, not dates)
+        text_like = text_like[:5]
+        if text_like and sum(text_like) >= len(text_like) * 0.6:
+            return cls.SCORE_TEXT_LIKE
+        return cls.SCORE_NONE
     
-    async def _download_file(self, url: str) -> bytes:
-        """Download file content from URL."""
+    async def _download_file(self, url: str) -> Tuple[str, bytes]:
+        """Download file content from URL into a temporary file, returning its path and leading bytes."""
         # Convert Google Drive URL if needed
         if is_google_drive_url(url):
             direct_url = convert_google_drive_url(url)
@@ -267,25 +401,42 @@ class FileLoaderImpl(FileLoader):
                 raise ValueError("Failed to convert Google Drive URL to direct download")
             url = direct_url
         
-        def download():
-            async def _download():
-                # Create a new session for this request to avoid event loop issues
-                timeout = aiohttp.ClientTimeout(total=30)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url) as response:
-                        if response.status != 200:
-                            raise ValueError(f"Failed to download file: HTTP {response.status}")
-                        
-                        return await response.read()
-            
-            return _download()
+        async def download() -> Tuple[str, bytes]:
+            # Reuse pooled keep-alive connections across downloads
+            session = await self._get_session()
+            async with session.get(url) as response:
+                if response.status >= 500:
+                    # Server errors are transient and worth another attempt
+                    raise aiohttp.ClientError(f"Failed to download file: HTTP {response.status}")
+                if response.status != 200:
+                    raise ValueError(f"Failed to download file: HTTP {response.status}")
+                
+                # Stream to disk so the payload is never held in memory as a whole
+                head = bytearray()
+                with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as temp_file:
+                    try:
+                        size = 0
+                        async for chunk in response.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE):
+                            size += len(chunk)
+                            if size > self.MAX_FILE_SIZE:
+                                raise ValueError(f"File exceeds size limit of {self.MAX_FILE_SIZE} bytes")
+                            temp_file.write(chunk)
+                            # Keep the leading bytes for file type sniffing without rereading the file
+                            if len(head) < self.DETECT_HEAD_SIZE:
+                                head += chunk[:self.DETECT_HEAD_SIZE - len(head)]
+                    except BaseException:
+                        temp_file.close()
+                        os.unlink(temp_file.name)
+                        raise
+                    return temp_file.name, bytes(head)
         
-        # Use retry logic for download
-        return await retry_with_backoff(
+        # Retry network failures; other HTTP errors fail immediately
+        return await async_retry_with_backoff(
             download,
             max_attempts=3,
             base_delay=1.0,
-            backoff_factor=2.0
+            backoff_factor=2.0,
+            retry_on=(aiohttp.ClientError, asyncio.TimeoutError)
         )
     
     def _detect_file_type(self, url: str, content: bytes) -> str:
@@ -300,200 +451,199 @@ class FileLoaderImpl(FileLoader):
                 return 'excel'
         
         # Try to detect from content
-        if content.startswith(b'\x50\x4b'):  # ZIP signature (XLSX)
+        if content.startswith(self.ZIP_SIGNATURES):
             return 'excel'
-        elif b',' in content[:1000] or b';' in content[:1000]:  # CSV-like
-            return 'csv'
         
-        # Default to CSV
+        # Anything else, delimited or not, is read as CSV
         return 'csv'
     
     async def _parse_csv_content(self, content: bytes) -> List[str]:
         """Parse CSV content from bytes."""
-        keywords = []
+        keywords, encoding = await self._decode_csv_keywords(content)
+        self.logger.info(f"Parsed {len(keywords)} keywords from CSV content ({encoding})")
+        return keywords
+    
+    async def _decode_csv_keywords(self, source: Union[str, bytes]) -> Tuple[List[str], str]:
+        """Read CSV keywords from a path or bytes, trying each supported encoding in turn."""
+        if isinstance(source, str):
+            head = await asyncio.to_thread(self._read_head, source, self.ENCODING_SNIFF_SIZE)
+        else:
+            head = source[:self.ENCODING_SNIFF_SIZE]
         
-        try:
-            # Try UTF-8 first
-            text = content.decode('utf-8-sig')
-        except UnicodeDecodeError:
+        # Without quotes the first field is just the text before the first comma
+        quoted = b'"' in (head if isinstance(source, str) else source)
+        
+        for encoding, errors in self._csv_encodings_for(head):
             try:
-                # Try cp1251
-                text = content.decode('cp1251')
+                keywords, invalid_rows = await asyncio.to_thread(
+                    self._read_csv_keywords, source, encoding, errors, quoted, self.settings.max_keywords_limit
+                )
+                break
             except UnicodeDecodeError:
-                # Fallback to utf-8 with errors='ignore'
-                text = content.decode('utf-8', errors='ignore')
+                continue
         
-        # Parse CSV content
-        csv_reader = csv.reader(io.StringIO(text))
+        self._warn_dropped_rows(invalid_rows)
+        return keywords, encoding
+    
+    def _warn_dropped_rows(self, invalid_rows: List[Tuple[int, str]], skipped_count: int = 0) -> None:
+        """Log one summary of dropped rows instead of a record per row."""
+        if skipped_count:
+            self.logger.warning(
+                f"Skipped {skipped_count} non-keyword rows (periods, headers, etc.)",
+                skipped_count=skipped_count
+            )
         
-        for row_num, row in enumerate(csv_reader, 1):
-            if not row:
-                continue
-            
-            keyword = row[0].strip()
-            if keyword and validate_keyword(keyword):
-                cleaned_keyword = clean_keyword(keyword)
-                keywords.append(cleaned_keyword)
-            elif keyword:
-                self.logger.warning(
-                    f"Invalid keyword in row {row_num}: '{keyword}'",
-                    row_number=row_num,
-                    keyword=keyword
-                )
+        if invalid_rows:
+            samples = invalid_rows[:self.INVALID_SAMPLES_LOGGED]
+            self.logger.warning(
+                f"Invalid keywords in {len(invalid_rows)} rows, first {len(samples)} (row, keyword): {samples}",
+                count=len(invalid_rows),
+                samples=samples
+            )
+    
+    @staticmethod
+    def _read_head(file_path: str, size: int) -> bytes:
+        """Read the leading bytes of a file."""
+        with open(file_path, 'rb') as file:
+            return file.read(size)
+    
+    @classmethod
+    def _csv_encodings_for(cls, head: bytes) -> Tuple[Tuple[str, str], ...]:
+        """Order CSV encodings so content that is clearly not UTF-8 skips the full UTF-8 pass."""
+        # A byte order mark settles the encoding without any trial decoding
+        if head.startswith(codecs.BOM_UTF8):
+            return (('utf-8-sig', 'strict'), ('utf-8-sig', 'ignore'))
+        if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return (('utf-16', 'strict'), ('utf-16', 'ignore'))
         
-        self.logger.info(f"Parsed {len(keywords)} keywords from CSV content")
-        return keywords
+        try:
+            # Incremental decoding tolerates a multi-byte character cut at the end of the head
+            codecs.getincrementaldecoder('utf-8-sig')().decode(head, final=False)
+        except UnicodeDecodeError:
+            return tuple(item for item in cls.CSV_ENCODINGS if item[0] != 'utf-8-sig')
+        return cls.CSV_ENCODINGS
     
-    async def _parse_excel_content(self, content: bytes) -> List[str]:
-        """Parse Excel content from bytes."""
+    @classmethod
+    def _read_csv_keywords(
+        cls,
+        source: Union[str, bytes],
+        encoding: str,
+        errors: str,
+        quoted: bool = True,
+        max_keywords: Optional[int] = None
+    ) -> Tuple[List[str], List[Tuple[int, str]]]:
+        """Read keywords from a CSV path or bytes, decoding rows lazily as they are parsed."""
+        if isinstance(source, str):
+            text = open(source, 'r', encoding=encoding, errors=errors, newline='')
+        else:
+            text = io.TextIOWrapper(io.BytesIO(source), encoding=encoding, errors=errors, newline='')
+        
+        with text:
+            keywords, invalid_rows, _ = cls._collect_keywords(cls._iter_csv_fields(text, quoted), max_keywords)
+        return keywords, invalid_rows
+    
+    @staticmethod
+    def _iter_csv_fields(text: Iterable[str], quoted: bool) -> Iterator[Tuple[int, str]]:
+        """Yield the row number and stripped first field of every non-empty CSV row."""
+        row_num = 1
+        if not quoted:
+            # Split lines directly until the first quote; the csv module takes the
+            # rest of the stream from there, since a quoted field may span lines
+            text = iter(text)
+            for line in text:
+                if '"' in line:
+                    text = chain([line], text)
+                    break
+                yield row_num, line.split(',', 1)[0].strip()
+                row_num += 1
+        
+        for row_num, row in enumerate(csv.reader(text), row_num):
+            if row:
+                yield row_num, row[0].strip()
+    
+    @classmethod
+    def _collect_keywords(
+        cls,
+        fields: Iterable[Tuple[int, str]],
+        max_keywords: Optional[int] = None,
+        skip_non_keywords: bool = False
+    ) -> Tuple[List[str], List[Tuple[int, str]], int]:
+        """Validate and clean (row, field) pairs in batches, stopping once past the keywords limit."""
+        keywords = []
+        invalid_rows = []
+        skipped_count = 0
+        fields = iter(fields)
+        
+        while True:
+            batch = list(islice(fields, cls.KEYWORD_BATCH_SIZE))
+            if not batch:
+                break
+            
+            values = pd.Series(
+                [field for _, field in batch],
+                index=[row_num for row_num, _ in batch],
+                dtype=object
+            )
+            values = values[values != '']
+            if skip_non_keywords:
+                # Report exports mix in periods, headers, etc.
+                skip_mask = values.str.contains(SKIP_RE)
+                skipped_count += int(skip_mask.sum())
+                values = values[~skip_mask]
+            
+            valid_mask = validate_keyword_vec(values)
+            keywords.extend(clean_keyword_vec(values[valid_mask]).tolist())
+            invalid_rows.extend(values[~valid_mask].items())
+            
+            if max_keywords is not None and len(keywords) > max_keywords:
+                # Keep one keyword over the limit so callers can reject the file
+                # with validate_keywords_count; the total count is not known
+                del keywords[max_keywords + 1:]
+                break
+        
+        return keywords, invalid_rows, skipped_count
+    
+    async def _parse_excel_content(self, content: Union[str, bytes]) -> List[str]:
+        """Parse Excel content from bytes or a file path."""
         try:
             # Try to read as Excel directly first
             try:
-                return await self._load_from_excel_bytes(content)
+                return await self._load_from_workbook(content)
             except Exception as excel_error:
                 # If direct Excel read fails, try to extract from ZIP
                 self.logger.info(f"Direct Excel read failed, trying ZIP extraction: {excel_error}")
                 
-                import zipfile
-                with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
-                    # Find Excel files in the ZIP
-                    excel_files = [f for f in zip_file.namelist() if f.endswith(('.xlsx', '.xls'))]
-                    
-                    if not excel_files:
-                        raise ValueError("No Excel files found in ZIP archive")
-                    
-                    # Use the first Excel file
-                    excel_file = excel_files[0]
-                    self.logger.info(f"Extracting Excel file from ZIP: {excel_file}")
-                    
-                    with zip_file.open(excel_file) as excel_data:
-                        excel_content = excel_data.read()
-                        return await self._load_from_excel_bytes(excel_content)
+                excel_file, excel_content = await asyncio.to_thread(self._extract_excel_from_zip, content)
+                self.logger.info(f"Extracted Excel file from ZIP: {excel_file}")
+                return await self._load_from_workbook(excel_content)
             
         except Exception as e:
             raise ValueError(f"Failed to parse Excel content: {e}")
     
+    @staticmethod
+    def _extract_excel_from_zip(content: Union[str, bytes]) -> Tuple[str, bytes]:
+        """Extract the first Excel file from a ZIP archive path or bytes."""
+        with zipfile.ZipFile(content if isinstance(content, str) else io.BytesIO(content)) as zip_file:
+            # Find Excel files in the ZIP
+            excel_files = [f for f in zip_file.namelist() if f.endswith(('.xlsx', '.xls'))]
+            
+            if not excel_files:
+                raise ValueError("No Excel files found in ZIP archive")
+            
+            # Use the first Excel file
+            excel_file = excel_files[0]
+            with zip_file.open(excel_file) as excel_data:
+                return excel_file, excel_data.read()
+    
     async def _load_from_excel_bytes(self, content: bytes) -> List[str]:
         """Load keywords from Excel bytes using the new sheet detection logic."""
-        try:
-            # First, check all sheets to find the one with keywords
-            xl = pd.ExcelFile(io.BytesIO(content))
-            self.logger.info(f"Excel file has {len(xl.sheet_names)} sheets: {xl.sheet_names}")
-            
-            keywords_sheet = None
-            keywords_column = None
-            
-            # Look for sheet with keywords
-            for sheet_name in xl.sheet_names:
-                df = pd.read_excel(io.BytesIO(content), sheet_name=sheet_name)
-                if df.empty:
-                    continue
-                
-                # Check if this sheet has a column with keywords
-                for col in df.columns:
-                    col_str = str(col).strip().lower()
-                    if any(keyword in col_str for keyword in ['поисковый', 'запрос', 'keyword', 'ключевое', 'слово']):
-                        # Check if this column has actual keyword data (not just headers)
-                        non_null_values = df[col].dropna()
-                        if len(non_null_values) > 1:  # More than just header
-                            # Check if values look like keywords
-                            sample_values = non_null_values.head(10)
-                            text_like_count = sum(1 for val in sample_values if isinstance(val, str) and len(str(val).strip()) > 2)
-                            if text_like_count >= len(sample_values) * 0.7:  # 70% text-like
-                                keywords_sheet = sheet_name
-                                keywords_column = col
-                                self.logger.info(f"Found keywords in sheet '{sheet_name}', column '{col}' with {len(non_null_values)} values")
-                                break
-                
-                if keywords_sheet:
-                    break
-            
-            # If no keywords sheet found, use first sheet
-            if keywords_sheet is None:
-                keywords_sheet = xl.sheet_names[0]
-                self.logger.warning(f"No keywords sheet found, using first sheet: '{keywords_sheet}'")
-            
-            # Read the selected sheet
-            df = pd.read_excel(io.BytesIO(content), sheet_name=keywords_sheet)
-            
-            if df.empty:
-                self.logger.warning(f"Sheet '{keywords_sheet}' is empty")
-                return []
-            
-            # If no keywords column found, try to find it
-            if keywords_column is None:
-                # First, try to find column with header "Ключевое слово" or similar
-                for col in df.columns:
-                    col_str = str(col).strip().lower()
-                    if any(keyword in col_str for keyword in ['ключевое', 'keyword', 'слово', 'запрос']):
-                        keywords_column = col
-                        self.logger.info(f"Found keywords column: '{col}'")
-                        break
-                
-                # If not found, look for the first column that contains text data
-                if keywords_column is None:
-                    for col in df.columns:
-                        # Check if column contains mostly text data
-                        non_null_count = df[col].notna().sum()
-                        if non_null_count > 0:
-                            # Check if values look like keywords (not numbers, not dates)
-                            sample_values = df[col].dropna().head(5)
-                            if len(sample_values) > 0:
-                                text_like_count = sum(1 for val in sample_values if isinstance(val, str) and len(str(val).strip()) > 2)
-                                if text_like_count >= len(sample_values) * 0.6:  # 60% text-like
-                                    keywords_column = col
-                                    self.logger.info(f"Using first text-like column: '{col}'")
-                                    break
-                
-                # Fallback to first column
-                if keywords_column is None:
-                    keywords_column = df.columns[0]
-                    self.logger.warning(f"No suitable keywords column found, using first column: '{keywords_column}'")
-            
-            # Extract keywords from the found column
-            keywords = []
-            for row_num, value in enumerate(df[keywords_column], 1):
-                if pd.isna(value):
-                    continue
-                
-                keyword = str(value).strip()
-                
-                # Skip obvious non-keywords (periods, headers, etc.)
-                if any(skip_word in keyword.lower() for skip_word in ['период', 'period', 'выбранный', 'предыдущий', 'аналитика', 'сводка', 'статистика']):
-                    self.logger.warning(f"Skipping non-keyword in row {row_num}: '{keyword}'")
-                    continue
-                
-                if keyword and validate_keyword(keyword):
-                    cleaned_keyword = clean_keyword(keyword)
-                    keywords.append(cleaned_keyword)
-                elif keyword:
-                    self.logger.warning(
-                        f"Invalid keyword in row {row_num}: '{keyword}'",
-                        row_number=row_num,
-                        keyword=keyword
-                    )
-            
-            # Log first 5 keywords for debugging
-            if keywords:
-                first_5 = keywords[:5]
-                self.logger.info(f"First 5 keywords loaded: {first_5}")
-            else:
-                self.logger.warning("No valid keywords found in Excel file!")
-                # Log all values for debugging
-                all_values = [str(val).strip() for val in df[keywords_column].dropna()]
-                self.logger.warning(f"All values in column '{keywords_column}': {all_values}")
-            
-            self.logger.info(f"Loaded {len(keywords)} keywords from Excel file")
-            return keywords
-            
-        except Exception as e:
-            raise ValueError(f"Failed to read Excel file: {e}")
+        return await self._load_from_workbook(content)
     
     def validate_file_size(self, file_path: str) -> bool:
         """Validate file size is within limits."""
         try:
             file_size = os.path.getsize(file_path)
-            max_size = 10 * 1024 * 1024  # 10MB limit
+            max_size = self.MAX_FILE_SIZE
             
             if file_size > max_size:
                 self.logger.warning(
@@ -38,6 +38,7 @@ class RankingResult(BaseModel):
     found_keywords: int
     execution_time_seconds: float
     export_file_path: Optional[str] = None
+    export_filename: Optional[str] = None
 
 
 @runtime_checkable
@@ -143,19 +144,19 @@ class FileExporter(Protocol):
 class Logger(Protocol):
     """Protocol for logging operations."""
     
-    def info(self, message: str, **kwargs) -> None:
+    def info(self, message: str, *args, **kwargs) -> None:
         """Log info message."""
         ...
     
-    def warning(self, message: str, **kwargs) -> None:
+    def warning(self, message: str, *args, **kwargs) -> None:
         """Log warning message."""
         ...
     
-    def error(self, message: str, **kwargs) -> None:
+    def error(self, message: str, *args, **kwargs) -> None:
         """Log error message."""
         ...
     
-    def debug(self, message: str, **kwargs) -> None:
+    def debug(self, message: str, *args, **kwargs) -> None:
         """Log debug message."""
         ...
 
@@ -2,14 +2,14 @@
 
 import asyncio
 import time
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from app.config import Settings
 from app.ports import (
     RankingService, SearchClient, FileLoader, FileExporter, 
     Logger, ProgressTracker, RankingResult, SearchResult, Product
 )
-from app.utils import WBURLParser, format_execution_time
+from app.utils import format_execution_time, parse_wb_url
 
 
 class RankingServiceImpl(RankingService):
@@ -121,7 +121,7 @@ class RankingServiceImpl(RankingService):
     async def rank_product_by_keywords(
         self,
         product_url: str,
-        keywords_source: str | List[str],
+        keywords_source: str | List[str] | Tuple[str, bytes],
         output_format: str = "xlsx"
     ) -> RankingResult:
         """
@@ -129,7 +129,8 @@ class RankingServiceImpl(RankingService):
         
         Args:
             product_url: Wildberries product URL
-            keywords_source: Path to keywords file or URL
+            keywords_source: Path to keywords file, URL, keywords list or
+                (file name, content) tuple of an uploaded file
             output_format: Output format ('csv' or 'xlsx')
             
         Returns:
@@ -217,13 +218,9 @@ class RankingServiceImpl(RankingService):
         """Validate URL and extract product ID."""
         self.logger.info(f"Validating product URL: {product_url}")
         
-        parser = WBURLParser()
-        if not parser.validate_wb_url(product_url):
-            raise ValueError(f"Invalid Wildberries URL: {product_url}")
-        
-        product_id = parser.extract_product_id(product_url)
+        product_id = parse_wb_url(product_url)
         if not product_id:
-            raise ValueError(f"Could not extract product ID from URL: {product_url}")
+            raise ValueError(f"Invalid Wildberries URL: {product_url}")
         
         self.logger.info(f"Extracted product ID: {product_id}")
         
@@ -232,8 +229,11 @@ class RankingServiceImpl(RankingService):
         
         return product_id
     
-    async def _load_keywords(self, keywords_source: str | List[str]) -> List[str]:
-        """Load keywords from file, URL, or use provided list."""
+    async def _load_keywords(
+        self, 
+        keywords_source: str | List[str] | Tuple[str, bytes]
+    ) -> List[str]:
+        """Load keywords from file, URL, uploaded content, or use provided list."""
         if isinstance(keywords_source, list):
             # Keywords are already provided as a list
             self.logger.info(f"Using provided keywords list: {len(keywords_source)} keywords")
@@ -243,15 +243,17 @@ class RankingServiceImpl(RankingService):
             
             return keywords_source
         
-        # Original logic for string sources
-        self.logger.info(f"Loading keywords from: {keywords_source}")
+        source_name = keywords_source[0] if isinstance(keywords_source, tuple) else keywords_source
+        self.logger.info(f"Loading keywords from: {source_name}")
         
         if self.progress_tracker:
             await self.progress_tracker.send_message("📁 Загружаем ключевые слова...")
         
         try:
-            # Determine if source is URL or file path
-            if keywords_source.startswith(('http://', 'https://')):
+            # Determine if source is uploaded content, URL or file path
+            if isinstance(keywords_source, tuple):
+                keywords = await self.file_loader.load_keywords_from_bytes(*keywords_source)
+            elif keywords_source.startswith(('http://', 'https://')):
                 keywords = await self.file_loader.load_keywords_from_url(keywords_source)
             else:
                 keywords = await self.file_loader.load_keywords_from_file(keywords_source)
@@ -434,6 +436,7 @@ class RankingServiceImpl(RankingService):
             
             # Get export path
             export_path = self.file_exporter.get_export_path(filename)
+            ranking_result.export_filename = filename
             
             # Export based on format
             if output_format.lower() == 'csv':
@@ -1,14 +1,37 @@
 """Utility functions for WB Ranker Bot."""
 
+import asyncio
 import re
 import time
 import aiohttp
 import json
-from typing import Optional, Tuple, List, Dict, Any
+import logging
+from typing import TYPE_CHECKING, Optional, Tuple, List, Dict, Any, Union, Awaitable, Callable, Type, TypeVar
 from urllib.parse import urlparse, parse_qs
 
 from app.ports import URLParser
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+T = TypeVar('T')
+
+
+# Longest keyword accepted by validation
+KEYWORD_MAX_LENGTH = 100
+
+# Characters not allowed in keywords and whitespace runs collapsed when cleaning
+INVALID_KEYWORD_CHARS_RE = re.compile(r'[<>"\'&\n\r\t]')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Single-pass WB product URL pattern capturing the product ID
+WB_URL_RE = re.compile(r'https?://(?:www\.)?wildberries\.ru/catalog/(\d+)/')
+
 
 class WBURLParser(URLParser):
     """Wildberries URL parser implementation."""
@@ -82,6 +105,35 @@ class WBURLParser(URLParser):
             
         except Exception:
             return False
+    
+    def parse_wb_url(self, url: str) -> Optional[int]:
+        """
+        Validate WB product URL and extract product ID in one pass.
+        
+        Args:
+            url: URL to parse
+            
+        Returns:
+            Product ID or None if URL is not a valid WB product URL
+        """
+        return parse_wb_url(url)
+
+
+def parse_wb_url(url: str) -> Optional[int]:
+    """
+    Validate WB product URL and extract product ID in one regex pass.
+    
+    Args:
+        url: URL to parse
+        
+    Returns:
+        Product ID or None if URL is not a valid WB product URL
+    """
+    if not url or not isinstance(url, str):
+        return None
+    
+    match = WB_URL_RE.match(url)
+    return int(match.group(1)) if match else None
 
 
 def calculate_position(page: int, index_on_page: int, items_per_page: int = 100) -> int:
@@ -176,17 +228,33 @@ def validate_keyword(keyword: str) -> bool:
     keyword = keyword.strip()
     
     # Check length
-    if len(keyword) < 1 or len(keyword) > 100:
+    if len(keyword) < 1 or len(keyword) > KEYWORD_MAX_LENGTH:
         return False
     
     # Check for invalid characters
-    invalid_chars = ['<', '>', '"', "'", '&', '\n', '\r', '\t']
-    if any(char in keyword for char in invalid_chars):
+    if INVALID_KEYWORD_CHARS_RE.search(keyword):
         return False
     
     return True
 
 
+def validate_keyword_vec(keywords: "pd.Series") -> "pd.Series":
+    """
+    Validate a Series of string keywords at once, matching validate_keyword.
+    
+    Args:
+        keywords: Keywords to validate
+        
+    Returns:
+        Boolean mask of valid keywords
+    """
+    stripped = keywords.str.strip()
+    return (
+        stripped.str.len().between(1, KEYWORD_MAX_LENGTH)
+        & ~stripped.str.contains(INVALID_KEYWORD_CHARS_RE, na=True)
+    )
+
+
 def clean_keyword(keyword: str) -> str:
     """
     Clean and normalize keyword.
@@ -204,11 +272,24 @@ def clean_keyword(keyword: str) -> str:
     keyword = keyword.strip()
     
     # Remove extra spaces
-    keyword = re.sub(r'\s+', ' ', keyword)
+    keyword = WHITESPACE_RE.sub(' ', keyword)
     
     return keyword
 
 
+def clean_keyword_vec(keywords: "pd.Series") -> "pd.Series":
+    """
+    Clean a Series of string keywords at once, matching clean_keyword.
+    
+    Args:
+        keywords: Raw keywords
+        
+    Returns:
+        Cleaned keywords
+    """
+    return keywords.str.strip().str.replace(WHITESPACE_RE, ' ', regex=True)
+
+
 def extract_filename_from_url(url: str) -> Optional[str]:
     """
     Extract filename from URL.
@@ -332,6 +413,43 @@ def retry_with_backoff(
     raise last_exception
 
 
+async def async_retry_with_backoff(
+    func: Callable[[], Awaitable[T]],
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    backoff_factor: float = 2.0,
+    max_delay: float = 60.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+) -> T:
+    """
+    Retry coroutine function with exponential backoff.
+    
+    Args:
+        func: Coroutine function to retry, called anew on every attempt
+        max_attempts: Maximum number of attempts
+        base_delay: Base delay in seconds
+        backoff_factor: Backoff multiplication factor
+        max_delay: Maximum delay in seconds
+        retry_on: Exception types that trigger another attempt
+        
+    Returns:
+        Coroutine result
+        
+    Raises:
+        Last exception if all attempts failed
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await func()
+        except retry_on:
+            if attempt == max_attempts - 1:
+                raise
+            
+            # Calculate delay with exponential backoff
+            delay = min(base_delay * (backoff_factor ** attempt), max_delay)
+            await asyncio.sleep(delay)
+
+
 def create_progress_message(current: int, total: int, message: str = "") -> str:
     """
     Create progress message.
@@ -354,6 +472,50 @@ def create_progress_message(current: int, total: int, message: str = "") -> str:
     return progress_msg
 
 
+def json_loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JSONFormatter(logging.Formatter):
+    """Log formatter emitting one JSON object per record."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        
+        if orjson is not None:
+            return orjson.dumps(entry, default=str).decode()
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = "INFO", log_format: str = "text") -> None:
+    """
+    Configure root logging.
+    
+    Args:
+        level: Logging level name
+        log_format: Output format ('json' or 'text')
+    """
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        )
+    
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+
+
 async def search_by_term(product_id: int, search_term: str, max_pages: int = 3) -> Optional[Dict[str, Any]]:
     """Search for a specific product by term in WB API."""
     try:
@@ -378,7 +540,7 @@ async def search_by_term(product_id: int, search_term: str, max_pages: int = 3)
                     if response.status == 200:
                         # Принудительно читаем как текст и парсим как JSON
                         text_content = await response.text()
-                        data = json.loads(text_content)
+                        data = json_loads(text_content)
                         if 'data' in data and 'products' in data['data']:
                             # Find product with matching ID
                             for product in data['data']['products']:
@@ -1,17 +1,16 @@
 """Wildberries API adapter implementation."""
 
 import asyncio
-import json
 import random
 from typing import Dict, List, Optional
 from urllib.parse import urlencode
 
 import aiohttp
-from aiohttp import ClientTimeout, ClientError
+from aiohttp import ClientTimeout, ClientError, TCPConnector
 
 from app.config import Settings
 from app.ports import SearchClient, SearchResult, Product, Logger
-from app.utils import format_price, calculate_position
+from app.utils import format_price, calculate_position, json_loads
 
 
 class WBAPIAdapter(SearchClient):
@@ -33,7 +32,13 @@ class WBAPIAdapter(SearchClient):
         """Async context manager entry."""
         if self._session_owner:
             timeout = ClientTimeout(total=self.settings.wb_request_timeout)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            connector = TCPConnector(
+                limit=100,
+                limit_per_host=30,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -196,7 +201,7 @@ class WBAPIAdapter(SearchClient):
             # Parse response as JSON (force parsing even if content-type is text/plain)
             try:
                 text_content = await response.text()
-                data = json.loads(text_content)
+                data = json_loads(text_content)
                 self.logger.debug(f"Successfully parsed JSON response")
             except Exception as e:
                 self.logger.error(f"Failed to parse response as JSON: {e}")
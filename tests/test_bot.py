@@ -5,12 +5,14 @@ from unittest.mock import AsyncMock, Mock, patch
 from datetime import datetime
 
 import pytest
-from telegram import Update, Message, User, Chat, Document, File, CallbackQuery
+from telegram import Update, Message, User, Chat, Document, File, CallbackQuery, InputFile
 from telegram.ext import ContextTypes
 
 from app.config import Settings
+from app.fileio import FileLoaderImpl
+from app.ports import SearchResult
 from app.bot import (
-    TelegramProgressTracker, TelegramLogger, WBRankerBot,
+    _CLASSIFY, TelegramProgressTracker, TelegramLogger, UserSession, WBRankerBot,
     main
 )
 
@@ -110,13 +112,15 @@ class TestTelegramProgressTracker:
     async def test_update_progress_edit_message(self, mock_update, mock_context):
         """Test progress update with message edit."""
         tracker = TelegramProgressTracker(mock_update, mock_context)
+        tracker.FLUSH_INTERVAL = 0
         
         # First update (creates message)
         await tracker.update_progress(5, 10, "Test message")
         assert tracker.last_message_id is not None
         
-        # Second update (edits message)
+        # Second update (edits message on the next flush)
         await tracker.update_progress(8, 10, "Updated message")
+        await asyncio.sleep(0.01)
         
         # Verify edit was called
         mock_context.bot.edit_message_text.assert_called_once()
@@ -125,6 +129,25 @@ class TestTelegramProgressTracker:
         assert call_args[1]['message_id'] == tracker.last_message_id
         assert "Обработано: 8/10" in call_args[1]['text']
     
+    @pytest.mark.asyncio
+    async def test_update_progress_throttled(self, mock_update, mock_context):
+        """Test small progress changes are coalesced."""
+        tracker = TelegramProgressTracker(mock_update, mock_context)
+
+        await tracker.update_progress(10, 1000)
+        await tracker.update_progress(11, 1000)
+        await tracker.update_progress(12, 1000)
+
+        # Only the first update is sent, the rest wait for the flusher
+        mock_context.bot.send_message.assert_called_once()
+        mock_context.bot.edit_message_text.assert_not_called()
+        assert tracker._pending == (12, 1000, None, None)
+
+        # Completion is always published right away
+        await tracker.update_progress(1000, 1000)
+        mock_context.bot.edit_message_text.assert_called_once()
+        assert tracker._flush_handle is None
+
     @pytest.mark.asyncio
     async def test_send_message(self, mock_update, mock_context):
         """Test sending general message."""
@@ -146,8 +169,7 @@ class TestTelegramProgressTracker:
         
         mock_context.bot.send_message.assert_called_once_with(
             chat_id=mock_update.effective_chat.id,
-            text="❌ Test error",
-            parse_mode='HTML'
+            text="❌ Test error"
         )
     
     @pytest.mark.asyncio
@@ -159,8 +181,7 @@ class TestTelegramProgressTracker:
         
         mock_context.bot.send_message.assert_called_once_with(
             chat_id=mock_update.effective_chat.id,
-            text="✅ Test success",
-            parse_mode='HTML'
+            text="✅ Test success"
         )
     
     def test_create_progress_bar(self, mock_update, mock_context):
@@ -202,6 +223,45 @@ class TestTelegramLogger:
         
         # Verify local logging
         logger.logger.error.assert_called_once_with("Test error message")
+    
+    def test_lazy_formatting_args(self, mock_context):
+        """Test that format arguments are passed to the local logger."""
+        logger = TelegramLogger(mock_context, 12345)
+        logger.logger = Mock()
+        
+        logger.info("URL: %.5s...", "https://example.com")
+        
+        logger.logger.info.assert_called_once_with("URL: %.5s...", "https://example.com")
+    
+    @pytest.mark.asyncio
+    async def test_mirror_level_filter_and_batching(self, mock_context):
+        """Test that only messages above the level are mirrored in one batch."""
+        logger = TelegramLogger(mock_context, 12345)
+        logger.MIRROR_DEBOUNCE = 0
+        logger.attach_loop(asyncio.get_running_loop())
+        
+        logger.info("Info message")
+        logger.error("First error")
+        logger.error("Second %s", "error")
+        await asyncio.sleep(0.01)
+        await logger.stop()
+        
+        mock_context.bot.send_message.assert_called_once()
+        text = mock_context.bot.send_message.call_args[1]['text']
+        assert text == "❌ First error\n❌ Second error"
+    
+    @pytest.mark.asyncio
+    async def test_mirror_queue_drops_when_full(self, mock_context):
+        """Test that mirrored messages are dropped when the queue is full."""
+        logger = TelegramLogger(mock_context, 12345)
+        logger.MIRROR_QUEUE_SIZE = 2
+        logger.attach_loop(asyncio.get_running_loop())
+        
+        for i in range(5):
+            logger.error(f"Error {i}")
+        
+        assert logger._mirror_queue.qsize() == 2
+        await logger.stop()
 
 
 class TestWBRankerBot:
@@ -252,6 +312,19 @@ class TestWBRankerBot:
             assert "Статус WB Ranker Bot" in call_args[1]['text']
             assert "Активен" in call_args[1]['text']
     
+    @pytest.mark.asyncio
+    async def test_check_api_health_cached(self, bot):
+        """Test that health checks reuse the shared adapter result."""
+        assert await bot._check_api_health() is False  # Not initialized
+        
+        bot._health_cache = None
+        bot.wb_adapter = Mock()
+        bot.wb_adapter.health_check = AsyncMock(return_value=True)
+        
+        assert await bot._check_api_health() is True
+        assert await bot._check_api_health() is True
+        bot.wb_adapter.health_check.assert_called_once()
+    
     @pytest.mark.asyncio
     async def test_cancel_command(self, bot, mock_update, mock_context):
         """Test /cancel command."""
@@ -263,13 +336,13 @@ class TestWBRankerBot:
         call_args = mock_update.message._bot.send_message.call_args
         assert call_args[1]['chat_id'] == mock_update.effective_chat.id
         assert call_args[1]['text'] == "ℹ️ Нет активных операций для отмены"
-        assert call_args[1]['parse_mode'] == 'HTML'
+        assert not call_args[1]['parse_mode']  # Plain text reply
         
         # Reset mock for second test
         mock_update.message._bot.send_message.reset_mock()
         
         # Test cancel with active session
-        bot.active_sessions[user_id] = {'test': 'data'}
+        bot.active_sessions[user_id] = UserSession()
         await bot.cancel_command(mock_update, mock_context)
         
         # Verify session was cleared
@@ -281,19 +354,14 @@ class TestWBRankerBot:
         # Create update with URL text
         mock_update = MockUpdate(text="https://wildberries.ru/catalog/12345/detail.aspx")
         
-        with patch('app.bot.WBURLParser') as mock_parser_class:
-            mock_parser = Mock()
-            mock_parser.validate_wb_url.return_value = True
-            mock_parser.extract_product_id.return_value = 12345
-            mock_parser_class.return_value = mock_parser
-            
+        with patch('app.bot.parse_wb_url', return_value=12345):
             await bot.handle_url_message(mock_update, mock_context)
             
             # Verify URL was processed
             user_id = mock_update.effective_user.id
             assert user_id in bot.active_sessions
-            assert bot.active_sessions[user_id]['product_url'] == mock_update.message.text
-            assert bot.active_sessions[user_id]['product_id'] == 12345
+            assert bot.active_sessions[user_id].product_url == mock_update.message.text
+            assert bot.active_sessions[user_id].product_id == 12345
             
             # Verify success message
             mock_update.message._bot.send_message.assert_called_once()
@@ -306,11 +374,7 @@ class TestWBRankerBot:
         # Create update with invalid URL text
         mock_update = MockUpdate(text="https://invalid-url.com/product")
         
-        with patch('app.bot.WBURLParser') as mock_parser_class:
-            mock_parser = Mock()
-            mock_parser.validate_wb_url.return_value = False
-            mock_parser_class.return_value = mock_parser
-            
+        with patch('app.bot.parse_wb_url', return_value=None):
             await bot.handle_url_message(mock_update, mock_context)
             
             # Verify error message
@@ -335,17 +399,17 @@ class TestWBRankerBot:
     async def test_handle_document_with_session(self, bot, mock_context, mock_document):
         """Test handling document with active session."""
         user_id = 12345
-        bot.active_sessions[user_id] = {
-            'product_url': 'https://wildberries.ru/catalog/12345/detail.aspx',
-            'product_id': 12345
-        }
+        bot.active_sessions[user_id] = UserSession(
+            product_url='https://wildberries.ru/catalog/12345/detail.aspx',
+            product_id=12345
+        )
         
         # Create update with document
         mock_update = MockUpdate(user_id=user_id, document=mock_document)
         
         # Mock file download
         mock_file = AsyncMock()
-        mock_file.download_to_drive = AsyncMock()
+        mock_file.download_as_bytearray = AsyncMock(return_value=bytearray(b"keyword1\n"))
         mock_context.bot.get_file.return_value = mock_file
         
         # Mock the ranking process to avoid complex setup
@@ -354,6 +418,89 @@ class TestWBRankerBot:
             
             # Verify ranking process was started
             mock_start_ranking.assert_called_once_with(mock_update, mock_context, user_id)
+        
+        # The downloaded buffer is stored as is
+        assert bot.active_sessions[user_id].keywords_bytes == (mock_document.file_name, bytearray(b"keyword1\n"))
+    
+    @pytest.mark.asyncio
+    async def test_upload_rejected_while_ranking(self, bot, mock_context, mock_document):
+        """Test that a user cannot start a second ranking while one is running or queued."""
+        user_id = 12345
+        bot.active_sessions[user_id] = UserSession(
+            product_url='https://wildberries.ru/catalog/12345/detail.aspx',
+            product_id=12345
+        )
+        mock_file = AsyncMock()
+        mock_file.download_as_bytearray = AsyncMock(return_value=bytearray(b"keyword1\n"))
+        mock_context.bot.get_file.return_value = mock_file
+        release = asyncio.Event()
+        
+        async def start_ranking(update, context, user_id):
+            await release.wait()
+        
+        with patch.object(bot, '_start_ranking_process', side_effect=start_ranking) as mock_start_ranking:
+            first = asyncio.create_task(
+                bot.handle_document(MockUpdate(user_id=user_id, document=mock_document), mock_context)
+            )
+            await asyncio.sleep(0)
+            
+            second_update = MockUpdate(user_id=user_id, document=mock_document)
+            await bot.handle_document(second_update, mock_context)
+            url_update = MockUpdate(user_id=user_id, text="https://docs.google.com/spreadsheets/d/abc")
+            await bot.handle_file_url_message(url_update, mock_context)
+            
+            release.set()
+            await first
+        
+        mock_start_ranking.assert_called_once()
+        for update in (second_update, url_update):
+            call_args = update.message._bot.send_message.call_args
+            assert "Анализ уже выполняется" in call_args[1]['text']
+        assert user_id not in bot._ranking_users
+    
+    @pytest.mark.asyncio
+    async def test_keywords_load_while_fetching_product(self, bot, mock_context):
+        """Test that keywords are loaded concurrently with product info."""
+        update = Mock()
+        update.message.reply_text = AsyncMock(return_value=AsyncMock())
+        bot.file_loader = Mock()
+        bot.file_loader.load_keywords_from_bytes = AsyncMock(return_value=["keyword1", "keyword2"])
+        
+        async def fake_get_product_info(product_id):
+            await asyncio.sleep(0)
+            bot.file_loader.load_keywords_from_bytes.assert_called_once_with("keywords.csv", b"data")
+            return {'is_fallback': True}
+        
+        with patch('app.bot.get_product_info', side_effect=fake_get_product_info):
+            keywords = await bot._analyze_and_filter_keywords(
+                update, mock_context,
+                "https://www.wildberries.ru/catalog/123456/detail.aspx",
+                ("keywords.csv", b"data")
+            )
+        
+        assert keywords == ["keyword1", "keyword2"]
+    
+    @pytest.mark.asyncio
+    async def test_keywords_over_limit_rejected_before_filtering(self, bot, mock_context):
+        """Test that a file past the keywords limit is rejected instead of ranked on a prefix."""
+        bot.settings = bot.settings.model_copy(update={'max_keywords_limit': 2})
+        analysis_msg = AsyncMock()
+        update = Mock()
+        update.message.reply_text = AsyncMock(return_value=analysis_msg)
+        bot.file_loader = FileLoaderImpl(bot.settings, Mock())
+        bot.file_loader.load_keywords_from_bytes = AsyncMock(return_value=["k1", "k2", "k3"])
+        
+        with patch('app.bot.get_product_info', AsyncMock(return_value={'name': 'Чехол', 'brand': 'X'})), \
+                patch('app.bot.filter_keywords_by_relevance') as mock_filter:
+            keywords = await bot._analyze_and_filter_keywords(
+                update, mock_context,
+                "https://www.wildberries.ru/catalog/123456/detail.aspx",
+                ("keywords.csv", b"data")
+            )
+        
+        assert keywords == []
+        mock_filter.assert_not_called()
+        assert "больше 2" in analysis_msg.edit_text.call_args[0][0]
     
     @pytest.mark.asyncio
     async def test_handle_text_message_url(self, bot, mock_context):
@@ -365,6 +512,15 @@ class TestWBRankerBot:
             await bot.handle_text_message(mock_update, mock_context)
             mock_handle_url.assert_called_once_with(mock_update, mock_context)
     
+    @pytest.mark.asyncio
+    async def test_handle_text_message_file_url(self, bot, mock_context):
+        """Test handling text message that is a file URL."""
+        mock_update = MockUpdate(text="https://docs.google.com/spreadsheets/d/abc/edit")
+        
+        with patch.object(bot, 'handle_file_url_message') as mock_handle_file_url:
+            await bot.handle_text_message(mock_update, mock_context)
+            mock_handle_file_url.assert_called_once_with(mock_update, mock_context)
+    
     @pytest.mark.asyncio
     async def test_handle_text_message_non_url(self, bot, mock_context):
         """Test handling text message that is not a URL."""
@@ -397,6 +553,185 @@ class TestWBRankerBot:
             await bot.callback_query_handler(mock_update, mock_context)
             mock_help.assert_called_once_with(mock_update, mock_context)
     
+    def test_classify_text(self):
+        """Test classification of text messages into file URLs and other URLs."""
+        assert _CLASSIFY.match("https://drive.google.com/file/d/abc/view").group('file')
+        assert _CLASSIFY.match("https://DOCS.Google.com/spreadsheets/d/abc").group('file')
+        assert _CLASSIFY.match("https://yandex.ru/disk/keywords.xlsx").group('file')
+        
+        match = _CLASSIFY.match("https://wildberries.ru/catalog/12345/detail.aspx")
+        assert match.group('file') is None
+        assert match.group('url')
+        
+        # The scheme is case-sensitive, as with the previous startswith check
+        assert _CLASSIFY.match("HTTPS://wildberries.ru/catalog/12345/detail.aspx") is None
+        assert _CLASSIFY.match("Hello world") is None
+
+    def test_is_duplicate(self, bot):
+        """Test duplicate update detection."""
+        update = Mock()
+        update.update_id = 1
+
+        assert bot._is_duplicate(update) is False
+        assert bot._is_duplicate(update) is True
+
+        # Oldest entries are evicted once the cache is full
+        for update_id in range(2, bot.SEEN_UPDATES_MAX + 2):
+            update.update_id = update_id
+            bot._is_duplicate(update)
+
+        assert len(bot._seen_updates) == bot.SEEN_UPDATES_MAX
+        update.update_id = 1
+        assert bot._is_duplicate(update) is False
+
+    @pytest.mark.asyncio
+    async def test_drop_duplicate_update(self, bot, mock_context):
+        """Test duplicate updates stop handler processing."""
+        from telegram.ext import ApplicationHandlerStop
+
+        update = Mock()
+        update.update_id = 42
+
+        await bot.drop_duplicate_update(update, mock_context)
+        with pytest.raises(ApplicationHandlerStop):
+            await bot.drop_duplicate_update(update, mock_context)
+
+    @pytest.mark.asyncio
+    async def test_ranking_slot_queue(self, bot, mock_update):
+        """Test that rankings above the limit wait in a queue."""
+        bot._ranking_sem = asyncio.Semaphore(1)
+        
+        async with bot._ranking_slot(mock_update):
+            waiter = asyncio.create_task(bot._ranking_slot(mock_update).__aenter__())
+            await asyncio.sleep(0)
+            
+            assert not waiter.done()
+            assert bot._ranking_waiters == 1
+            call_args = mock_update.message._bot.send_message.call_args
+            assert "в очереди, позиция 1" in call_args[1]['text']
+        
+        await waiter
+        assert bot._ranking_waiters == 0
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_rankings_keep_own_progress(self, bot):
+        """Test that overlapping rankings report progress only to their own tracker."""
+        keywords_by_user = {1: ["alpha", "beta"], 2: ["gamma", "delta", "epsilon"]}
+        product_url = "https://www.wildberries.ru/catalog/123456/detail.aspx"
+        
+        async def search_product(keyword, product_id, max_pages):
+            # Yield so the two runs interleave
+            await asyncio.sleep(0)
+            return SearchResult(
+                keyword=keyword, product=None, position=None, page=None, total_pages_searched=max_pages
+            )
+        
+        async def analyze(update, context, url, source):
+            return keywords_by_user[update.effective_user.id]
+        
+        bot.wb_adapter = Mock()
+        bot.wb_adapter.search_product = AsyncMock(side_effect=search_product)
+        bot.file_loader = Mock()
+        bot.file_loader.validate_keywords_count.return_value = True
+        bot.file_exporter = Mock()
+        bot.file_exporter.export_to_xlsx = AsyncMock()
+        bot.file_exporter.get_export_path.return_value = "/tmp/report.xlsx"
+        
+        trackers = {}
+        
+        def create_tracker(update, context):
+            tracker = AsyncMock()
+            trackers[update.effective_user.id] = tracker
+            return tracker
+        
+        updates = {}
+        for user_id in keywords_by_user:
+            bot.active_sessions[user_id] = UserSession(product_url=product_url, file_url="https://example.com/k.csv")
+            updates[user_id] = Mock()
+            updates[user_id].effective_user.id = user_id
+            updates[user_id].message.reply_text = AsyncMock()
+        
+        with patch('app.bot.TelegramProgressTracker', side_effect=create_tracker), \
+                patch.object(bot, '_analyze_and_filter_keywords', side_effect=analyze), \
+                patch.object(bot, '_send_ranking_results', new_callable=AsyncMock) as send_results:
+            await asyncio.gather(*(
+                bot._start_ranking_process(updates[user_id], Mock(), user_id)
+                for user_id in keywords_by_user
+            ))
+        
+        for user_id, keywords in keywords_by_user.items():
+            totals = {call.kwargs['total'] for call in trackers[user_id].update_progress.call_args_list}
+            assert totals == {len(keywords)}
+        
+        totals_sent = sorted(call.args[2].total_keywords for call in send_results.call_args_list)
+        assert totals_sent == [2, 3]
+    
+    @pytest.mark.asyncio
+    async def test_ranking_cancelled_while_queued(self, bot, mock_context):
+        """Test that a ranking cancelled while queued ends quietly."""
+        user_id = 12345
+        bot._ranking_sem = asyncio.Semaphore(1)
+        bot.active_sessions[user_id] = UserSession(
+            product_url='https://wildberries.ru/catalog/12345/detail.aspx',
+            file_url='https://docs.google.com/spreadsheets/d/abc'
+        )
+        update = MockUpdate(user_id=user_id)
+        
+        with patch.object(bot, '_analyze_and_filter_keywords', new_callable=AsyncMock) as mock_analyze:
+            async with bot._ranking_slot(update):
+                queued = asyncio.create_task(bot._start_ranking_process(update, mock_context, user_id))
+                await asyncio.sleep(0)
+                await bot.cancel_command(update, mock_context)
+            
+            await queued
+        
+        mock_analyze.assert_not_called()
+        texts = [call[1]['text'] for call in update.message._bot.send_message.call_args_list]
+        assert not any("Ошибка" in text for text in texts)
+        assert "✅ Операция отменена" in texts
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_exports_periodically(self, bot):
+        """Test that old exports are cleaned up in the background."""
+        bot.CLEANUP_INTERVAL = 0
+        bot.file_exporter = Mock()
+        
+        task = asyncio.create_task(bot._cleanup_exports_periodically())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        
+        bot.file_exporter.cleanup_old_files.assert_called_with(
+            bot.settings.output_directory, bot.EXPORT_MAX_AGE_DAYS
+        )
+    
+    @pytest.mark.asyncio
+    async def test_send_ranking_results_streams_file(self, bot, tmp_path):
+        """Test that the report file is uploaded from an open file handle."""
+        export_file = tmp_path / "wb_ranking_123456.xlsx"
+        export_file.write_bytes(b"report")
+        result = Mock(
+            product_id=123456, product_name="Test", total_keywords=4, found_keywords=1,
+            execution_time_seconds=1.0, export_file_path=str(export_file),
+            export_filename="wb_ranking_123456.xlsx",
+            results=[Mock(position=3), Mock(position=7), Mock(position=None)]
+        )
+        update = Mock()
+        update.message.reply_text = AsyncMock()
+        update.message.reply_document = AsyncMock()
+        
+        await bot._send_ranking_results(update, Mock(), result)
+        
+        # Summary is sent as the document caption in a single request
+        update.message.reply_text.assert_not_called()
+        caption = update.message.reply_document.call_args[1]['caption']
+        assert "Процент найденных:</b> 25.0%\n" in caption
+        assert "Средняя позиция: 5.0\n• Лучшая позиция: 3\n• Худшая позиция: 7" in caption
+        assert update.message.reply_document.call_args[1]['parse_mode'] == 'HTML'
+        
+        document = update.message.reply_document.call_args[1]['document']
+        assert isinstance(document, InputFile)
+        assert document.filename == "wb_ranking_123456.xlsx"
+    
     def test_setup_handlers(self, bot):
         """Test handler setup."""
         bot.application = Mock()
@@ -405,6 +740,13 @@ class TestWBRankerBot:
         
         # Verify handlers were added
         assert bot.application.add_handler.call_count >= 6  # At least 6 handlers
+        
+        # Document uploads must not block other updates
+        document_handler = next(
+            call[0][0] for call in bot.application.add_handler.call_args_list
+            if getattr(call[0][0], 'callback', None) == bot.handle_document
+        )
+        assert document_handler.block is False
 
 
 @pytest.mark.asyncio
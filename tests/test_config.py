@@ -3,7 +3,7 @@
 import pytest
 from pydantic import ValidationError
 
-from app.config import Settings
+from app.config import Settings, get_settings
 
 
 class TestSettings:
@@ -105,6 +105,34 @@ class TestSettings:
         with pytest.raises(ValidationError):
             Settings(bot_token="test", wb_concurrency_limit=25)  # Above maximum
     
+    def test_telegram_pool_settings(self):
+        """Test Telegram connection pool settings."""
+        settings = Settings(bot_token="test")
+        
+        assert settings.tg_connection_pool_size == 64
+        assert settings.tg_get_updates_pool_size == 8
+        assert settings.tg_pool_timeout == 20.0
+        
+        with pytest.raises(ValidationError):
+            Settings(bot_token="test", tg_connection_pool_size=0)  # Below minimum
+    
+    def test_webhook_settings(self):
+        """Test webhook settings."""
+        settings = Settings(bot_token="test")
+        
+        assert settings.tg_webhook_url is None
+        assert settings.tg_webhook_port == 8443
+        
+        with pytest.raises(ValidationError):
+            Settings(bot_token="test", tg_webhook_secret="not/allowed")  # Invalid characters
+    
+    def test_settings_immutable(self):
+        """Test that settings cannot be changed after loading."""
+        settings = Settings(bot_token="test")
+        
+        with pytest.raises(ValidationError):
+            settings.wb_max_pages = 10
+    
     def test_required_fields(self):
         """Test required fields."""
         # Missing bot_token
@@ -114,3 +142,15 @@ class TestSettings:
         # Valid with required field
         settings = Settings(bot_token="test_token")
         assert settings.bot_token == "test_token"
+    
+    def test_get_settings_cached(self, monkeypatch):
+        """Test that settings are loaded once and reused."""
+        monkeypatch.setenv("BOT_TOKEN", "env_token")
+        get_settings.cache_clear()
+        
+        try:
+            settings = get_settings()
+            assert settings.bot_token == "env_token"
+            assert get_settings() is settings
+        finally:
+            get_settings.cache_clear()
@@ -2,13 +2,16 @@
 
 import csv
 import os
+import shutil
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pandas as pd
 import pytest
+from openpyxl import load_workbook
 
 from app.config import Settings
 from app.exporter import FileExporterImpl
@@ -195,6 +198,46 @@ class TestFileExporterImpl:
         finally:
             os.unlink(temp_file)
     
+    @pytest.mark.asyncio
+    async def test_export_to_xlsx_numeric_prices(self, settings, mock_logger, sample_ranking_result):
+        """Test that XLSX prices are numbers with a currency format."""
+        exporter = FileExporterImpl(settings, mock_logger)
+        
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as f:
+            temp_file = f.name
+        
+        try:
+            await exporter.export_to_xlsx(sample_ranking_result, temp_file)
+            
+            workbook = load_workbook(temp_file)
+            price_cell = workbook['Результаты поиска']['E2']
+            assert isinstance(price_cell.value, float)
+            assert price_cell.number_format == exporter.MONEY_FORMAT
+            workbook.close()
+            
+        finally:
+            os.unlink(temp_file)
+    
+    @pytest.mark.asyncio
+    async def test_export_to_xlsx_in_process_pool(self, settings, mock_logger, sample_ranking_result):
+        """Test XLSX export through a worker process."""
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            exporter = FileExporterImpl(settings, mock_logger, process_pool=pool)
+            exporter.PROCESS_POOL_MIN_RESULTS = 0
+            
+            with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as f:
+                temp_file = f.name
+            
+            try:
+                await exporter.export_to_xlsx(sample_ranking_result, temp_file)
+                
+                workbook = load_workbook(temp_file)
+                assert workbook.sheetnames == ['Результаты поиска', 'Сводка', 'Статистика']
+                workbook.close()
+                
+            finally:
+                os.unlink(temp_file)
+    
     @pytest.mark.asyncio
     async def test_export_to_csv_with_errors(self, settings, mock_logger):
         """Test CSV export with error results."""
@@ -260,6 +303,34 @@ class TestFileExporterImpl:
             if os.path.exists("test_output"):
                 os.rmdir("test_output")
     
+    @pytest.mark.asyncio
+    async def test_export_skips_mkdir_for_known_directory(self, settings, mock_logger, sample_ranking_result, tmp_path):
+        """Test that the output directory is created only once per exporter."""
+        exporter = FileExporterImpl(settings, mock_logger)
+        
+        await exporter.export_to_csv(sample_ranking_result, str(tmp_path / "out" / "first.csv"))
+        
+        with patch.object(Path, 'mkdir') as mock_mkdir:
+            await exporter.export_to_csv(sample_ranking_result, str(tmp_path / "out" / "second.csv"))
+        
+        mock_mkdir.assert_not_called()
+        assert (tmp_path / "out" / "second.csv").exists()
+    
+    @pytest.mark.asyncio
+    async def test_export_recreates_deleted_directory(self, settings, mock_logger, sample_ranking_result, tmp_path):
+        """Test that export recovers when the output directory is removed after first use."""
+        exporter = FileExporterImpl(settings, mock_logger)
+        output_dir = tmp_path / "out"
+        
+        await exporter.export_to_xlsx(sample_ranking_result, str(output_dir / "first.xlsx"))
+        shutil.rmtree(output_dir)
+        
+        await exporter.export_to_xlsx(sample_ranking_result, str(output_dir / "second.xlsx"))
+        await exporter.export_to_csv(sample_ranking_result, str(output_dir / "third.csv"))
+        
+        assert (output_dir / "second.xlsx").exists()
+        assert (output_dir / "third.csv").exists()
+    
     def test_generate_filename(self, settings, mock_logger):
         """Test filename generation."""
         exporter = FileExporterImpl(settings, mock_logger)
@@ -391,26 +462,3 @@ class TestFileExporterImpl:
         assert first_row[4] == '1500.50 ₽'  # price
         assert first_row[5] == 1  # page
         assert first_row[6] == 'Найден'  # status
-    
-    def test_prepare_excel_data(self, settings, mock_logger, sample_ranking_result):
-        """Test Excel data preparation."""
-        exporter = FileExporterImpl(settings, mock_logger)
-        
-        data = exporter._prepare_excel_data(sample_ranking_result)
-        
-        # Check results data
-        assert len(data['results']) == 3
-        
-        # Check summary data
-        assert len(data['summary']) == 7
-        
-        # Check statistics data
-        assert len(data['statistics']) > 0
-        
-        # Verify summary contains expected fields
-        summary_params = [item['Параметр'] for item in data['summary']]
-        assert 'ID товара' in summary_params
-        assert 'Название товара' in summary_params
-        assert 'Общее количество ключевых слов' in summary_params
-        assert 'Найдено товаров' in summary_params
-        assert 'Время выполнения' in summary_params
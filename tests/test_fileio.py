@@ -57,6 +57,14 @@ def mock_session():
     return session
 
 
+def iter_chunks(*chunks):
+    """Build a fake StreamReader.iter_chunked yielding given chunks."""
+    async def iter_chunked(size):
+        for chunk in chunks:
+            yield chunk
+    return iter_chunked
+
+
 @pytest.fixture
 def temp_csv_file():
     """Create temporary CSV file for testing."""
@@ -155,7 +163,8 @@ class TestFileLoaderImpl:
         
         mock_response = AsyncMock()
         mock_response.status = 200
-        mock_response.read = AsyncMock(return_value=csv_content)
+        mock_response.content = Mock()
+        mock_response.content.iter_chunked = iter_chunks(csv_content[:10], csv_content[10:])
         
         cm = AsyncMock()
         cm.__aenter__ = AsyncMock(return_value=mock_response)
@@ -184,7 +193,8 @@ class TestFileLoaderImpl:
         
         mock_response = AsyncMock()
         mock_response.status = 200
-        mock_response.read = AsyncMock(return_value=excel_bytes)
+        mock_response.content = Mock()
+        mock_response.content.iter_chunked = iter_chunks(excel_bytes)
         
         cm = AsyncMock()
         cm.__aenter__ = AsyncMock(return_value=mock_response)
@@ -289,7 +299,7 @@ class TestFileLoaderImpl:
         assert loader.validate_keywords_count(keywords) is True
         
         # Invalid count (exceeds limit)
-        settings.max_keywords_limit = 50
+        loader.settings = settings.model_copy(update={"max_keywords_limit": 50})
         assert loader.validate_keywords_count(keywords) is False
     
     def test_get_file_info(self, settings, mock_logger):
@@ -327,6 +337,8 @@ class TestFileLoaderImpl:
         # Test Excel detection
         excel_content = b'\x50\x4b\x03\x04'  # ZIP signature
         assert loader._detect_file_type("https://example.com/file.xlsx", excel_content) == 'excel'
+        assert loader._detect_file_type("https://example.com/download", excel_content) == 'excel'
+        assert loader._detect_file_type("https://example.com/download", b'PK,not a zip') == 'csv'
         
         # Test default to CSV
         unknown_content = b"some content"
@@ -345,6 +357,60 @@ class TestFileLoaderImpl:
         assert 'keyword2' in keywords
         assert 'keyword3' in keywords
     
+    @pytest.mark.asyncio
+    async def test_parse_csv_content_cp1251(self, settings, mock_logger):
+        """Test parsing cp1251 CSV content falls back from UTF-8."""
+        loader = FileLoaderImpl(settings, mock_logger)
+        
+        csv_content = "телефон\r\nчехол\n".encode('cp1251')
+        keywords = await loader._parse_csv_content(csv_content)
+        
+        assert keywords == ['телефон', 'чехол']
+    
+    @pytest.mark.asyncio
+    async def test_parse_csv_content_utf16_bom(self, settings, mock_logger):
+        """Test parsing UTF-16 CSV content detected from its byte order mark."""
+        loader = FileLoaderImpl(settings, mock_logger)
+        
+        csv_content = "телефон,1\nчехол\n".encode('utf-16')
+        keywords = await loader._parse_csv_content(csv_content)
+        
+        assert keywords == ['телефон', 'чехол']
+    
+    @pytest.mark.asyncio
+    async def test_load_from_csv_multiline_field_after_sniff_window(self, settings, mock_logger, tmp_path):
+        """Test a quoted field spanning lines past the sniffed head is parsed by the csv module."""
+        loader = FileLoaderImpl(settings, mock_logger)
+        csv_file = tmp_path / "keywords.csv"
+        padding = b"alpha\r\n" * (FileLoaderImpl.ENCODING_SNIFF_SIZE // 7 + 1)
+        csv_file.write_bytes(padding + b'"two\r\nlines",x\r\nomega\r\n')
+        
+        keywords = await loader._load_from_csv(str(csv_file))
+        
+        # The whole multi-line field is one (invalid) keyword, not 'two' and 'lines"'
+        assert keywords[-2:] == ['alpha', 'omega']
+        assert 'two' not in keywords
+        warnings = [kwargs for level, _, kwargs in mock_logger.logs if level == "warning"]
+        assert [keyword for _, keyword in warnings[0]['samples']] == ['two\r\nlines']
+    
+    @pytest.mark.asyncio
+    async def test_parse_csv_content_stops_past_limit(self, settings, mock_logger):
+        """Test parsing stops one keyword past the limit so the count check still rejects it."""
+        loader = FileLoaderImpl(settings.model_copy(update={'max_keywords_limit': 2}), mock_logger)
+        
+        keywords = await loader._parse_csv_content(b"k1\nk2\nk3\nk4\nk5")
+        
+        assert keywords == ['k1', 'k2', 'k3']
+        assert loader.validate_keywords_count(keywords) is False
+    
+    @pytest.mark.asyncio
+    async def test_load_keywords_from_bytes_too_large(self, settings, mock_logger):
+        """Test oversized uploads are rejected before parsing."""
+        loader = FileLoaderImpl(settings, mock_logger)
+        
+        with pytest.raises(ValueError, match="too large"):
+            await loader.load_keywords_from_bytes("keywords.csv", b"k" * (FileLoaderImpl.MAX_FILE_SIZE + 1))
+    
     @pytest.mark.asyncio
     async def test_parse_excel_content(self, settings, mock_logger):
         """Test parsing Excel content from bytes."""
@@ -361,3 +427,15 @@ class TestFileLoaderImpl:
         assert len(keywords) == 2
         assert 'excel1' in keywords
         assert 'excel2' in keywords
+    
+    @pytest.mark.asyncio
+    async def test_load_keywords_from_bytes(self, settings, mock_logger):
+        """Test loading keywords from uploaded file content."""
+        loader = FileLoaderImpl(settings, mock_logger)
+        
+        keywords = await loader.load_keywords_from_bytes("keywords.csv", b"keyword1\nkeyword2")
+        
+        assert keywords == ['keyword1', 'keyword2']
+        
+        with pytest.raises(ValueError, match="Unsupported file format"):
+            await loader.load_keywords_from_bytes("keywords.txt", b"keyword1")
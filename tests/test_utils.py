@@ -1,22 +1,32 @@
 """Tests for utils module."""
 
+import json
+import logging
+
+import pandas as pd
 import pytest
 import time
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 from app.utils import (
     WBURLParser,
+    parse_wb_url,
     calculate_position,
     format_price,
     format_execution_time,
     truncate_string,
     validate_keyword,
+    validate_keyword_vec,
     clean_keyword,
+    clean_keyword_vec,
     extract_filename_from_url,
     is_google_drive_url,
     convert_google_drive_url,
     retry_with_backoff,
+    async_retry_with_backoff,
     create_progress_message,
+    json_loads,
+    JSONFormatter,
 )
 
 
@@ -79,6 +89,15 @@ class TestWBURLParser:
         
         for url in invalid_urls:
             assert self.parser.validate_wb_url(url) is False
+    
+    def test_parse_wb_url(self):
+        """Test validating and extracting product ID in one pass."""
+        assert self.parser.parse_wb_url("https://www.wildberries.ru/catalog/279266291/detail.aspx") == 279266291
+        assert self.parser.parse_wb_url("https://wildberries.ru/catalog/555666777/") == 555666777
+        assert self.parser.parse_wb_url("https://wildberries.ru/catalog/abc/detail.aspx") is None
+        assert self.parser.parse_wb_url("https://example.com/catalog/123/") is None
+        assert self.parser.parse_wb_url(None) is None
+        assert parse_wb_url("http://www.wildberries.ru/catalog/987654321/") == 987654321
 
 
 class TestCalculatePosition:
@@ -206,6 +225,18 @@ class TestCleanKeyword:
         assert clean_keyword("hello") == "hello"
 
 
+class TestKeywordVec:
+    """Test vectorized keyword validation and cleaning."""
+    
+    def test_vec_matches_scalar(self):
+        """Test Series versions agree with the scalar functions."""
+        keywords = ["  hello   world ", "", "keyword<tag>", "a" * 101, "tab\tinside", "телефон"]
+        series = pd.Series(keywords, dtype=object)
+        
+        assert validate_keyword_vec(series).tolist() == [validate_keyword(k) for k in keywords]
+        assert clean_keyword_vec(series).tolist() == [clean_keyword(k) for k in keywords]
+
+
 class TestExtractFilenameFromUrl:
     """Test filename extraction from URL."""
     
@@ -303,6 +334,43 @@ class TestRetryWithBackoff:
                 retry_with_backoff(always_fail, max_attempts=2)
 
 
+class TestAsyncRetryWithBackoff:
+    """Test async retry with backoff function."""
+    
+    @pytest.mark.asyncio
+    async def test_retry_success_after_failures(self):
+        """Test coroutine is called anew until it succeeds."""
+        call_count = 0
+        
+        async def failing_then_success():
+            nonlocal call_count
+            call_count += 1
+            if call_count < 3:
+                raise ConnectionError("Failed")
+            return "success"
+        
+        with patch('asyncio.sleep', new=AsyncMock()):
+            result = await async_retry_with_backoff(failing_then_success, max_attempts=3)
+        
+        assert result == "success"
+        assert call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_retry_skips_unlisted_exceptions(self):
+        """Test exceptions outside retry_on fail immediately."""
+        call_count = 0
+        
+        async def always_fail():
+            nonlocal call_count
+            call_count += 1
+            raise ValueError("Always fails")
+        
+        with pytest.raises(ValueError, match="Always fails"):
+            await async_retry_with_backoff(always_fail, retry_on=(ConnectionError,))
+        
+        assert call_count == 1
+
+
 class TestCreateProgressMessage:
     """Test progress message creation."""
     
@@ -320,3 +388,24 @@ class TestCreateProgressMessage:
     def test_create_progress_message_zero_total(self):
         """Test creating progress messages with zero total."""
         assert create_progress_message(0, 0) == "Прогресс: 0/0 (0.0%)"
+
+
+class TestJSONLogging:
+    """Test JSON helpers and log formatter."""
+    
+    def test_json_loads(self):
+        """Test parsing JSON from text and bytes."""
+        assert json_loads('{"a": 1}') == {"a": 1}
+        assert json_loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    
+    def test_json_formatter(self):
+        """Test formatting a log record as a JSON object."""
+        record = logging.LogRecord(
+            "app.bot", logging.WARNING, __file__, 1, "Товар %s", (123,), None
+        )
+        
+        entry = json.loads(JSONFormatter().format(record))
+        
+        assert entry["level"] == "WARNING"
+        assert entry["logger"] == "app.bot"
+        assert entry["message"] == "Товар 123"